@@ -0,0 +1,154 @@
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from face_recognizer import Detection
+from face_tracker import box_iou
+
+
+def merge_regions(regions):
+    """Union overlapping (x0, y0, x1, y1, scale) rectangles, keeping the finest scale"""
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]),
+                                  max(a[2], b[2]), max(a[3], b[3]), max(a[4], b[4]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+def dedupe_boxes(boxes, threshold=0.5):
+    """Drop boxes that mostly overlap one already kept (the same face seen twice)"""
+    kept = []
+    for box in boxes:
+        if all(box_iou(box, other) < threshold for other in kept):
+            kept.append(box)
+    return kept
+
+
+class AdaptiveRecognizer:
+    """Detect only where faces are likely, at a scale chosen from recent face sizes
+
+    Each frame is searched in regions of interest around faces seen in the
+    last history_frames frames and in any configured entry zones (fractions
+    of the frame as (x0, y0, x1, y1)). Each region is downscaled so that the
+    faces expected there come out about target_face pixels tall, which keeps
+    small, distant faces detectable while big, close faces are processed at
+    low resolution. Every full_scan_every frames the whole frame is scanned,
+    alternating between the scales in full_scan_scales so faces nobody has
+    seen yet are found at any distance. Encodings are always computed on the
+    full-resolution frame.
+    """
+
+    def __init__(self, recognizer, entry_zones=(), full_scan_every=10,
+                 full_scan_scales=(0.25, 0.5), target_face=80, min_scale=0.15,
+                 max_scale=1.0, history_frames=15, roi_margin=1.0):
+        self.recognizer = recognizer
+        self.entry_zones = list(entry_zones)
+        self.full_scan_every = full_scan_every
+        self.full_scan_scales = full_scan_scales
+        self.target_face = target_face
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.history_frames = history_frames
+        self.roi_margin = roi_margin
+
+        self.history = deque()  # (frame number, box) of recent faces
+        self.frame_count = 0
+        self.full_scans = 0
+        self.lock = threading.Lock()
+
+        # Share of frame pixels actually searched, for tuning
+        self.stats = {"frames": 0, "full_scans": 0, "roi_scans": 0, "pixels_scanned": 0.0}
+
+    @property
+    def matcher(self):
+        return self.recognizer.matcher
+
+    def identify(self, image, face_locations):
+        return self.recognizer.identify(image, face_locations)
+
+    def scale_for(self, face_height):
+        """Downscale factor that brings a face of face_height pixels to target_face"""
+        return float(np.clip(self.target_face / max(face_height, 1), self.min_scale, self.max_scale))
+
+    def default_scale(self):
+        """Scale for regions with no face of their own: fit the smallest recent face"""
+        if not self.history:
+            return self.full_scan_scales[0]
+        return self.scale_for(min(box[2] - box[0] for _, box in self.history))
+
+    def regions(self, shape):
+        """Regions to search in this frame as (x0, y0, x1, y1, scale)"""
+        height, width = shape[:2]
+        due = (self.frame_count - 1) % self.full_scan_every == 0
+        if due:
+            scale = self.full_scan_scales[self.full_scans % len(self.full_scan_scales)]
+            self.full_scans += 1
+            self.stats["full_scans"] += 1
+            return [(0, 0, width, height, scale)]
+
+        # One region per recent face, newest position first
+        recent = dedupe_boxes([box for _, box in reversed(self.history)], threshold=0.3)
+        regions = []
+        for top, right, bottom, left in recent:
+            margin_x = int((right - left) * self.roi_margin)
+            margin_y = int((bottom - top) * self.roi_margin)
+            regions.append((max(0, left - margin_x), max(0, top - margin_y),
+                            min(width, right + margin_x), min(height, bottom + margin_y),
+                            self.scale_for(bottom - top)))
+        for x0, y0, x1, y1 in self.entry_zones:
+            regions.append((int(x0 * width), int(y0 * height),
+                            int(x1 * width), int(y1 * height), self.default_scale()))
+        if regions:
+            self.stats["roi_scans"] += 1
+        return merge_regions(regions)
+
+    def locate(self, frame):
+        """Same contract as FaceRecognizer.locate; locations are in full-frame pixels"""
+        with self.lock:
+            self.frame_count += 1
+            self.stats["frames"] += 1
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame_pixels = float(frame.shape[0] * frame.shape[1])
+
+            boxes = []
+            for x0, y0, x1, y1, scale in self.regions(frame.shape):
+                crop = rgb_frame[y0:y1, x0:x1]
+                if crop.size == 0:
+                    continue
+                self.stats["pixels_scanned"] += (x1 - x0) * (y1 - y0) / frame_pixels
+                small = crop if scale >= 1.0 else cv2.resize(crop, (0, 0), fx=scale, fy=scale)
+                for top, right, bottom, left in self.recognizer.detect(small):
+                    boxes.append((int(top / scale) + y0, int(right / scale) + x0,
+                                  int(bottom / scale) + y0, int(left / scale) + x0))
+            boxes = dedupe_boxes(boxes)
+
+            # Remember where faces were and how big they were
+            for box in boxes:
+                self.history.append((self.frame_count, box))
+            while self.history and self.history[0][0] <= self.frame_count - self.history_frames:
+                self.history.popleft()
+            return rgb_frame, boxes, boxes
+
+    def reset(self):
+        with self.lock:
+            self.history.clear()
+            self.frame_count = 0
+
+    def recognize(self, frame):
+        """Return a Detection for every face found in a BGR frame"""
+        image, locations, boxes = self.locate(frame)
+        matches = self.identify(image, locations)
+        return [Detection(box, match) for box, match in zip(boxes, matches)]
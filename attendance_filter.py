@@ -1,116 +1,211 @@
-import mysql.connector
-from tkinter import *
-from tkinter import ttk, messagebox, simpledialog
-from openpyxl import Workbook
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+import os
+import queue
+import threading
 from datetime import datetime
+from data_access import Error
+from tkinter import *
+from tkinter import ttk, messagebox, filedialog
+from attendance_report import AttendancePager, export_report, export_rows, student_search
+from attendance_rollups import parse_month, summary
+
+# Load the next page once the last visible row is this far down the loaded rows
+LOAD_MORE_AT = 0.9
 
-# MySQL configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'harsh@2002',
-    'database': 'attendance_system'
+# Search-as-you-type waits this long after the last keystroke
+SEARCH_DELAY_MS = 300
+
+# Views in the selector; summaries are read from the rollup tables
+VIEWS = {
+    "Attendance records": None,
+    "Student summary": "students",
+    "Department summary": "departments",
+    "Daily by department": "daily",
 }
 
-def fetch_data(name=None, department=None, specific_date=None):
+pager = None
+search_generation = 0
+total_rows = None  # count for the current search, or the error counting it
+last_filter = None
+pending_search = None
+count_results = queue.Queue()
+
+def load_page():
+    """Append the next page of the current search to the table"""
+    if pager is None or pager.exhausted:
+        return
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        query = """
-        SELECT s.student_id, s.name, s.department, s.email, a.date, a.time
-        FROM students s
-        JOIN attendance a ON s.student_id = a.student_id
-        WHERE 1=1
-        """
-        params = []
-
-        if name:
-            query += " AND s.name LIKE %s"
-            params.append(f"%{name}%")
-        if department:
-            query += " AND s.department LIKE %s"
-            params.append(f"%{department}%")
-        if specific_date:
-            try:
-                datetime.strptime(specific_date, '%Y-%m-%d')
-                query += " AND a.date = %s"
-                params.append(specific_date)
-            except ValueError:
-                messagebox.showerror("Invalid Date", "Enter date as YYYY-MM-DD")
-                return []
-
-        query += " ORDER BY a.date DESC, a.time DESC"
-        cursor.execute(query, params)
-        return cursor.fetchall()
-
-    except mysql.connector.Error as err:
+        rows = pager.next_page()
+    except Error as err:
         messagebox.showerror("DB Error", str(err))
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
-
-def populate_table(data):
-    for row in tree.get_children():
-        tree.delete(row)
-    for row in data:
-        tree.insert("", END, values=row)
+        pager.exhausted = True
+        return
+    for row in rows:
+        tree.insert("", END, iid=row[6], values=row[:6])
+    update_count_label()
+
+def on_scroll(first, last):
+    scrollbar.set(first, last)
+    if float(last) >= LOAD_MORE_AT:
+        load_page()
+
+def count_rows(generation, current):
+    # Runs on a worker thread; the total can take far longer than a page
+    try:
+        count_results.put((generation, current.count()))
+    except Error as err:
+        count_results.put((generation, err))
+
+def poll_count():
+    global total_rows
+    try:
+        while True:
+            generation, total = count_results.get_nowait()
+            # Counts for searches that have since been replaced are dropped
+            if generation == search_generation:
+                total_rows = total
+                update_count_label()
+    except queue.Empty:
+        pass
+    root.after(100, poll_count)
+
+def update_count_label():
+    shown = len(tree.get_children())
+    if isinstance(total_rows, Exception):
+        count_label.config(text=f"Showing {shown} records (count failed: {total_rows})")
+    elif total_rows is None:
+        count_label.config(text=f"Showing {shown} records (counting...)")
+    else:
+        count_label.config(text=f"Showing {shown} of {total_rows} records")
+
+def schedule_search(event=None):
+    """Search once typing in the name or department field pauses"""
+    global pending_search
+    if pending_search:
+        root.after_cancel(pending_search)
+    pending_search = root.after(SEARCH_DELAY_MS, search_as_you_type)
+
+def search_as_you_type():
+    global pending_search
+    pending_search = None
+    # Keys that do not change the text (arrows, shift) do not restart the search
+    current = current_filter()
+    if current == last_filter:
+        return
+    try:
+        if current[2]:
+            datetime.strptime(current[2], '%Y-%m-%d')
+        if current[3] and current[4]:
+            parse_month(current[4])
+    except ValueError:
+        return
+    search_data()
+
+def current_filter():
+    return (name_entry.get().strip(), dept_entry.get().strip(), date_entry.get().strip(),
+            VIEWS[view_var.get()], month_entry.get().strip())
+
+def set_columns(names):
+    tree.configure(columns=names)
+    for col in names:
+        tree.heading(col, text=col)
+        tree.column(col, anchor=CENTER)
+
+def selected_month():
+    """The month entry as a date, None when empty; raises ValueError"""
+    text = month_entry.get().strip()
+    return parse_month(text) if text else None
+
+def show_summary(view):
+    """Fill the table with a summary view; these are small and load at once"""
+    global pager, search_generation, last_filter
+    try:
+        month = selected_month()
+    except ValueError:
+        messagebox.showerror("Invalid Month", "Enter month as YYYY-MM")
+        return
+    try:
+        names, rows = summary(view, month, name_entry.get().strip(), dept_entry.get().strip(),
+                              search=student_search)
+    except Error as err:
+        messagebox.showerror("DB Error", str(err))
+        return
 
-def initial_load():
-    data = fetch_data()
-    populate_table(data)
+    pager = None
+    last_filter = current_filter()
+    # Drops any count still running for a records search
+    search_generation += 1
+    tree.delete(*tree.get_children())
+    set_columns(names)
+    for row in rows:
+        tree.insert("", END, values=row)
+    count_label.config(text=f"{len(rows)} rows from the attendance rollups")
 
-def search_data():
+def search_data(event=None):
+    global pager, search_generation, total_rows, last_filter, pending_search
+    if pending_search:
+        root.after_cancel(pending_search)
+        pending_search = None
+    view = VIEWS[view_var.get()]
+    if view:
+        show_summary(view)
+        return
     name = name_entry.get().strip()
     dept = dept_entry.get().strip()
     specific_date = date_entry.get().strip()
-    data = fetch_data(name, dept, specific_date)
-    populate_table(data)
+    try:
+        new_pager = AttendancePager(name, dept, specific_date)
+    except ValueError:
+        messagebox.showerror("Invalid Date", "Enter date as YYYY-MM-DD")
+        return
+    except Error as err:
+        messagebox.showerror("DB Error", str(err))
+        return
+
+    pager = new_pager
+    last_filter = current_filter()
+    search_generation += 1
+    total_rows = None
+    tree.delete(*tree.get_children())
+    set_columns(columns)
+    threading.Thread(target=count_rows, args=(search_generation, pager), daemon=True).start()
+    load_page()
 
 def export_excel():
     name = name_entry.get().strip()
     dept = dept_entry.get().strip()
     specific_date = date_entry.get().strip()
-    data = fetch_data(name, dept, specific_date)
+    view = VIEWS[view_var.get()]
 
-    if not data:
-        messagebox.showinfo("No Data", "No data to export.")
-        return
-
-    file_name = simpledialog.askstring("Filename", "Enter Excel file name (without extension):")
+    file_name = filedialog.asksaveasfilename(
+        title="Export attendance", defaultextension=".xlsx",
+        filetypes=[("Excel workbook", "*.xlsx"), ("CSV", "*.csv")])
     if not file_name:
         return
 
+    # Rows are streamed from the database into the file, never held in memory
+    root.config(cursor="watch")
+    root.update_idletasks()
     try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Attendance Report"
-
-        headers = ["Student ID", "Name", "Department", "Email", "Date", "Time"]
-        ws.append(headers)
-
-        bold = Font(bold=True)
-        for col_num, col_name in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.font = bold
-
-        for row in data:
-            ws.append(row)
-
-        for col_num in range(1, len(headers) + 1):
-            max_len = max(len(str(ws.cell(row=i, column=col_num).value)) for i in range(1, len(data) + 2))
-            ws.column_dimensions[get_column_letter(col_num)].width = max_len + 2
-
-        wb.save(f"{file_name}.xlsx")
-        messagebox.showinfo("Success", f"Data saved to {file_name}.xlsx")
+        if view:
+            names, rows = summary(view, selected_month(), name, dept, search=student_search)
+            count = export_rows(rows, file_name, names)
+        else:
+            count = export_report(file_name, name, dept, specific_date)
+        if not count:
+            os.remove(file_name)
+            messagebox.showinfo("No Data", "No data to export.")
+            return
+        messagebox.showinfo("Success", f"{count} rows saved to {file_name}")
 
+    except ValueError:
+        if view:
+            messagebox.showerror("Invalid Month", "Enter month as YYYY-MM")
+        else:
+            messagebox.showerror("Invalid Date", "Enter date as YYYY-MM-DD")
     except Exception as e:
         messagebox.showerror("Export Error", str(e))
+    finally:
+        root.config(cursor="")
 
 # GUI Setup
 root = Tk()
@@ -129,8 +224,25 @@ Label(root, text="Date (YYYY-MM-DD):").grid(row=0, column=4, padx=5, pady=5, sti
 date_entry = Entry(root)
 date_entry.grid(row=0, column=5, padx=5, pady=5)
 
+Label(root, text="View:").grid(row=1, column=0, padx=5, pady=5, sticky=E)
+view_var = StringVar(value="Attendance records")
+view_box = ttk.Combobox(root, textvariable=view_var, values=list(VIEWS), state="readonly")
+view_box.grid(row=1, column=1, padx=5, pady=5)
+view_box.bind("<<ComboboxSelected>>", search_data)
+
+# Summary views cover this month, or all time when it is empty
+Label(root, text="Month (YYYY-MM):").grid(row=1, column=2, padx=5, pady=5, sticky=E)
+month_entry = Entry(root)
+month_entry.grid(row=1, column=3, padx=5, pady=5)
+
+name_entry.bind("<KeyRelease>", schedule_search)
+dept_entry.bind("<KeyRelease>", schedule_search)
+# A half-typed date is not searchable, so the date waits for Enter or Search
+for entry in (name_entry, dept_entry, date_entry, month_entry):
+    entry.bind("<Return>", search_data)
+
 Button(root, text="Search", command=search_data).grid(row=0, column=6, padx=10)
-Button(root, text="Download Excel", command=export_excel).grid(row=1, column=6, pady=10)
+Button(root, text="Download Excel/CSV", command=export_excel).grid(row=1, column=6, pady=10)
 
 # Table
 columns = ("Student ID", "Name", "Department", "Email", "Date", "Time")
@@ -138,7 +250,16 @@ tree = ttk.Treeview(root, columns=columns, show="headings")
 for col in columns:
     tree.heading(col, text=col)
     tree.column(col, anchor=CENTER)
-tree.grid(row=2, column=0, columnspan=7, padx=10, pady=10)
+tree.grid(row=2, column=0, columnspan=7, padx=(10, 0), pady=10)
+scrollbar = ttk.Scrollbar(root, orient=VERTICAL, command=tree.yview)
+scrollbar.grid(row=2, column=7, sticky=NS, pady=10, padx=(0, 10))
+# Rows are fetched a page at a time as the table is scrolled
+tree.configure(yscrollcommand=on_scroll)
+
+count_label = Label(root, anchor=W)
+count_label.grid(row=3, column=0, columnspan=7, padx=10, sticky=W)
 
-initial_load()
+# Open the window first, then fetch the first page
+root.after_idle(search_data)
+root.after(100, poll_count)
 root.mainloop()
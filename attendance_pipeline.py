@@ -0,0 +1,215 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# A processed frame: the annotated image plus what was found in it
+FrameResult = namedtuple("FrameResult", ["seq", "captured_at", "frame", "detections"])
+
+
+class LatestFrameGrabber:
+    """Read a capture device on its own thread, keeping only the newest frame"""
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.frame = None
+        self.seq = 0
+        self.captured_at = 0.0
+        self.failed = False
+        self.running = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.capture.read()
+            with self.condition:
+                if not ret:
+                    self.failed = True
+                    self.condition.notify_all()
+                    return
+                # Overwrite instead of queueing so old frames never pile up
+                self.frame = frame
+                self.seq += 1
+                self.captured_at = time.monotonic()
+                self.condition.notify_all()
+
+    def latest(self):
+        """Newest frame without waiting; returns (seq, captured_at, frame)"""
+        with self.condition:
+            return self.seq, self.captured_at, self.frame
+
+    def wait_newer(self, seq, timeout=0.5):
+        """Block until a frame newer than seq exists; return (seq, captured_at, frame)"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.seq > seq or self.failed or not self.running, timeout)
+            return self.seq, self.captured_at, self.frame
+
+
+class RecognitionPipeline:
+    """Capture -> detect/encode on a worker pool -> latest annotated frame for display
+
+    Frames wait in a bounded queue of max_pending entries. With drop_stale
+    enabled the oldest waiting frame is discarded when the queue is full, and
+    workers skip frames older than max_age seconds, so display latency stays
+    bounded when recognition cannot keep up. With drop_stale disabled every
+    grabbed frame the dispatcher sees is processed and the dispatcher blocks
+    instead.
+
+    An optional motion gate is checked in frame order by the dispatcher;
+    frames it rejects skip recognition and go straight to the display.
+
+    A frame whose recognition raises is counted in errors and dropped; the
+    workers keep going, and last_error holds the most recent exception.
+    """
+
+    def __init__(self, grabber, recognize, annotate=None, workers=2,
+                 max_pending=2, drop_stale=True, max_age=0.5, gate=None, metrics=None):
+        self.grabber = grabber
+        self.gate = gate
+        self.metrics = metrics
+        self.recognize = recognize
+        self.annotate = annotate
+        self.workers = workers
+        self.drop_stale = drop_stale
+        self.max_age = max_age
+
+        self.pending = queue.Queue(maxsize=max_pending)
+        # Detections from every processed frame, drained by the display loop
+        self.events = queue.Queue()
+
+        self.latest_result = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.threads = []
+
+        # Counters for the status line
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        if metrics:
+            metrics.watch("frame_queue", self.pending.qsize)
+            metrics.watch("event_queue", self.events.qsize)
+
+    def start(self):
+        self.running = True
+        self.grabber.start()
+        self.threads = [threading.Thread(target=self._dispatch, name="dispatcher", daemon=True)]
+        self.threads += [
+            threading.Thread(target=self._work, name=f"recognizer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.grabber.stop()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+
+    def latest(self):
+        """Most recent processed frame, or None before the first one is ready"""
+        with self.lock:
+            return self.latest_result
+
+    def _dispatch(self):
+        last_seq = 0
+        while self.running:
+            seq, captured_at, frame = self.grabber.wait_newer(last_seq)
+            if self.grabber.failed:
+                return
+            if seq <= last_seq or frame is None:
+                continue
+            last_seq = seq
+            item = (seq, captured_at, frame)
+
+            # Static scene: keep the preview moving without running detection
+            if self.gate and not self.gate.is_active(frame):
+                with self.lock:
+                    if self.latest_result is None or seq > self.latest_result.seq:
+                        self.latest_result = FrameResult(seq, captured_at, frame, [])
+                if self.metrics:
+                    self.metrics.frame()
+                    self.metrics.count("frames_skipped")
+                continue
+
+            if not self.drop_stale:
+                while self.running:
+                    try:
+                        self.pending.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                continue
+
+            # Make room by discarding the oldest waiting frame
+            while True:
+                try:
+                    self.pending.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.pending.get_nowait()
+                        with self.lock:
+                            self.dropped += 1
+                        if self.metrics:
+                            self.metrics.count("frames_dropped")
+                    except queue.Empty:
+                        pass
+
+    def _work(self):
+        while self.running:
+            try:
+                seq, captured_at, frame = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if self.drop_stale and time.monotonic() - captured_at > self.max_age:
+                with self.lock:
+                    self.dropped += 1
+                if self.metrics:
+                    self.metrics.count("frames_dropped")
+                continue
+
+            started = time.perf_counter()
+            try:
+                detections = self.recognize(frame)
+            except Exception as err:
+                # One bad frame must not take the worker down with it
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = err
+                if self.metrics:
+                    self.metrics.count("recognize_errors")
+                continue
+            if self.metrics:
+                self.metrics.observe("recognize", (time.perf_counter() - started) * 1000.0)
+                self.metrics.frame()
+                self.metrics.faces(detections)
+            if self.annotate:
+                frame = self.annotate(frame, detections)
+            result = FrameResult(seq, captured_at, frame, detections)
+            if detections:
+                self.events.put(detections)
+
+            with self.lock:
+                self.processed += 1
+                # Workers may finish out of order; never replace a newer frame
+                if self.latest_result is None or seq > self.latest_result.seq:
+                    self.latest_result = result
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import os
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from data_access import connect, get_database
+from student_search import StudentSearch, matching_query
+
+REPORT_COLUMNS = ["Student ID", "Name", "Department", "Email", "Date", "Time"]
+
+# Rows pulled from the server per round trip
+CHUNK_SIZE = 1000
+
+# Rows the viewer loads at a time
+PAGE_SIZE = 200
+
+MAX_COLUMN_WIDTH = 60
+
+# Above this many matching students the search is run again as a subquery
+# instead of passed as an IN list (SQLite allows 999 parameters on old builds)
+MAX_ID_LIST = 900
+
+student_search = StudentSearch()
+
+
+REPORT_FROM = """
+    FROM students s
+    JOIN attendance a ON s.student_id = a.student_id
+    WHERE 1=1
+"""
+
+REPORT_FIELDS = "SELECT s.student_id, s.name, s.department, s.email, a.date, a.time"
+
+NEWEST_FIRST = " ORDER BY a.date DESC, a.time DESC, a.id DESC"
+
+
+def report_filter(name=None, department=None, specific_date=None):
+    """(AND conditions, params) for the filter window's fields
+
+    Name and department terms are resolved to student_ids through the
+    search index first, so attendance is only read for those students.
+    Terms match anywhere in the text, ignoring case and accents.
+    When more than MAX_ID_LIST students match, the same trigram lookup is
+    used as a subquery instead of an IN list of their ids.
+    Raises ValueError when specific_date is not YYYY-MM-DD.
+    """
+    query = ""
+    params = []
+
+    if specific_date:
+        datetime.strptime(specific_date, '%Y-%m-%d')
+    student_ids = student_search.matching_ids(name, department)
+    if student_ids is not None:
+        if not student_ids:
+            return " AND 1=0", []
+        if len(student_ids) <= MAX_ID_LIST:
+            query += f" AND a.student_id IN ({', '.join(['%s'] * len(student_ids))})"
+            params.extend(student_ids)
+        else:
+            subquery, subquery_params = matching_query(name, department, get_database().backend)
+            query += f" AND a.student_id IN ({subquery})"
+            params.extend(subquery_params)
+    if specific_date:
+        query += " AND a.date = %s"
+        params.append(specific_date)
+    return query, params
+
+
+def report_query(name=None, department=None, specific_date=None):
+    """(sql, params) for every attendance row matching the filter, newest first"""
+    where, params = report_filter(name, department, specific_date)
+    return REPORT_FIELDS + REPORT_FROM + where + NEWEST_FIRST, params
+
+
+class AttendancePager:
+    """Newest-first pages of the filtered report, using keyset pagination on (date, time, id)
+
+    Each page starts just below the last row of the previous one, so every
+    page is an index seek on idx_attendance_date_time however deep the
+    viewer has scrolled, where OFFSET would read and skip all earlier rows.
+    """
+
+    def __init__(self, name=None, department=None, specific_date=None, page_size=PAGE_SIZE):
+        self.where, self.params = report_filter(name, department, specific_date)
+        self.page_size = page_size
+        self.last_key = None  # (date, time, id) of the last row handed out
+        self.exhausted = False
+
+    def next_page(self):
+        """Up to page_size more rows; the attendance id is appended to each row"""
+        if self.exhausted:
+            return []
+        query = REPORT_FIELDS + ", a.id" + REPORT_FROM + self.where
+        params = list(self.params)
+        if self.last_key:
+            # Leading a.date <= bound keeps this a range scan on the index
+            day, time, row_id = self.last_key
+            query += " AND a.date <= %s AND (a.date < %s OR a.time < %s OR (a.time = %s AND a.id < %s))"
+            params += [day, day, time, time, row_id]
+        query += NEWEST_FIRST + " LIMIT %s"
+        params.append(self.page_size)
+
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_key = tuple(rows[-1][4:7])
+        return rows
+
+    def count(self):
+        """Total rows matching the filter; a separate, slower query than a page"""
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT COUNT(*)" + REPORT_FROM + self.where, self.params)
+                return cursor.fetchone()[0]
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+
+def stream_rows(conn, query, params, chunk_size=CHUNK_SIZE):
+    """Yield result rows a chunk at a time instead of loading the whole result
+
+    mysql-connector cursors are unbuffered unless asked otherwise, so rows
+    stay on the server until fetchmany() asks for them; SQLite steps
+    through the result the same way.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def format_value(value):
+    """Text for CSV cells and width estimates; TIME columns come back as timedelta"""
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return "" if value is None else str(value)
+
+
+def write_csv(rows, path, columns=REPORT_COLUMNS):
+    """Write the report as CSV; returns the number of data rows"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([format_value(v) for v in row])
+            count += 1
+    return count
+
+
+def write_xlsx(rows, path, columns=REPORT_COLUMNS, sample_size=CHUNK_SIZE):
+    """Write the report through a write-only workbook; returns the number of data rows
+
+    Write-only sheets are flushed to disk row by row, so column widths have
+    to be declared before the first row. They are sized from the header and
+    the first sample_size rows, which are held back until then.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    widths = [len(h) for h in columns]
+    for row in sample:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(format_value(value)))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance Report")
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width, MAX_COLUMN_WIDTH) + 2
+
+    bold = Font(bold=True)
+    header = []
+    for title in columns:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row in chain(sample, rows):
+        ws.append(row)
+        count += 1
+    wb.save(path)
+    return count
+
+
+def export_rows(rows, path, columns=REPORT_COLUMNS):
+    """Write rows to an .xlsx or .csv file, by extension; returns the row count"""
+    write = write_csv if path.lower().endswith(".csv") else write_xlsx
+    return write(rows, path, columns)
+
+
+def export_report(path, name=None, department=None, specific_date=None, chunk_size=CHUNK_SIZE):
+    """Stream the filtered attendance report to an .xlsx or .csv file; returns the row count"""
+    query, params = report_query(name, department, specific_date)
+    conn = connect()
+    try:
+        return export_rows(stream_rows(conn, query, params, chunk_size), path)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the attendance report to Excel or CSV")
+    parser.add_argument("output", help="Output file; .csv writes CSV, anything else .xlsx")
+    parser.add_argument("--name", help="Student name contains")
+    parser.add_argument("--department", help="Department contains")
+    parser.add_argument("--date", help="Only this day (YYYY-MM-DD)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per fetch")
+    args = parser.parse_args()
+
+    try:
+        count = export_report(args.output, args.name, args.department, args.date, args.chunk_size)
+    except ValueError:
+        parser.error("--date must be YYYY-MM-DD")
+    if not count:
+        os.remove(args.output)
+        print("No data to export.")
+        return
+    print(f"Wrote {count} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
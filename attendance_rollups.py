@@ -0,0 +1,334 @@
+import argparse
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from data_access import Error
+
+# Attendance counts kept alongside the raw table. attendance already holds
+# one row per student per day, so the daily rollup is per department and
+# the monthly ones per student and per department. A row counts towards
+# its student's department at the time it is rolled up.
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS attendance_daily (
+        day DATE NOT NULL,
+        department VARCHAR(50) NOT NULL,
+        present INT NOT NULL,
+        PRIMARY KEY (day, department)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance_monthly_student (
+        month DATE NOT NULL,
+        student_id VARCHAR(20) NOT NULL,
+        days_present INT NOT NULL,
+        PRIMARY KEY (month, student_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance_monthly_department (
+        month DATE NOT NULL,
+        department VARCHAR(50) NOT NULL,
+        present INT NOT NULL,
+        PRIMARY KEY (month, department)
+    )
+    """,
+    # Highest attendance id already counted
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name VARCHAR(20) PRIMARY KEY,
+        last_id BIGINT NOT NULL
+    )
+    """,
+]
+
+# table -> (key columns, counter column)
+ROLLUPS = {
+    "attendance_daily": (("day", "department"), "present"),
+    "attendance_monthly_student": (("month", "student_id"), "days_present"),
+    "attendance_monthly_department": (("month", "department"), "present"),
+}
+
+# Rows read per round trip when rebuilding
+REBUILD_CHUNK = 10000
+
+NEW_ROWS = """
+    SELECT a.id, a.date, a.student_id, COALESCE(s.department, '')
+    FROM attendance a
+    LEFT JOIN students s ON s.student_id = a.student_id
+    WHERE a.id > %s
+"""
+
+
+def create_rollup_tables(cursor):
+    for ddl in ROLLUP_TABLES:
+        cursor.execute(ddl)
+    cursor.execute("INSERT IGNORE INTO rollup_state (name, last_id) VALUES ('attendance', 0)")
+
+
+def available(conn):
+    """True once the rollup migration has run on this database"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM rollup_state WHERE name = 'attendance'")
+        return cursor.fetchone()[0] > 0
+    except Error:
+        return False
+    finally:
+        cursor.close()
+
+
+def upsert_sql(backend, table):
+    keys, counter = ROLLUPS[table]
+    columns = ", ".join(keys + (counter,))
+    placeholders = ", ".join(["%s"] * (len(keys) + 1))
+    if backend == "sqlite":
+        return (f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {counter} = {counter} + excluded.{counter}")
+    return (f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE {counter} = {counter} + VALUES({counter})")
+
+
+def aggregate(rows, counts=None):
+    """Add (id, date, student_id, department) rows to per-table Counters; returns (counts, max id)"""
+    counts = counts or {table: Counter() for table in ROLLUPS}
+    last_id = 0
+    for row_id, day, student_id, department in rows:
+        month = day.replace(day=1)
+        counts["attendance_daily"][(day, department)] += 1
+        counts["attendance_monthly_student"][(month, student_id)] += 1
+        counts["attendance_monthly_department"][(month, department)] += 1
+        last_id = max(last_id, row_id)
+    return counts, last_id
+
+
+def add_counts(cursor, backend, counts):
+    for table, counter in counts.items():
+        if counter:
+            cursor.executemany(upsert_sql(backend, table),
+                               [key + (n,) for key, n in sorted(counter.items())])
+
+
+def lock(cursor):
+    """Take the rollup lock for this transaction; returns the last attendance id counted
+
+    attendance_writer.insert_attendance takes it before inserting, so
+    attendance ids are rolled up in the order they commit and no row is
+    counted twice or skipped.
+    """
+    cursor.execute("UPDATE rollup_state SET last_id = last_id WHERE name = 'attendance'")
+    cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'attendance'")
+    return cursor.fetchone()[0]
+
+
+def roll_up_new_rows(cursor, backend, last_id):
+    """Count attendance rows above last_id, in the caller's transaction; returns how many
+
+    Called by attendance_writer.insert_attendance after its insert, which
+    skips duplicates, so only rows that were actually inserted are counted.
+    """
+    cursor.execute(NEW_ROWS, (last_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    counts, new_last_id = aggregate(rows)
+    add_counts(cursor, backend, counts)
+    cursor.execute("UPDATE rollup_state SET last_id = %s WHERE name = 'attendance'", (new_last_id,))
+    return len(rows)
+
+
+def fill_rollups(cursor, backend, chunk_size=REBUILD_CHUNK):
+    """Recompute every rollup in the caller's transaction; returns the rows counted"""
+    lock(cursor)
+    for table in ROLLUPS:
+        cursor.execute(f"DELETE FROM {table}")
+    counts, last_id, total = None, 0, 0
+    while True:
+        # Keyset chunks keep memory bounded without a second connection
+        cursor.execute(NEW_ROWS + " ORDER BY a.id LIMIT %s", (last_id, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        counts, last_id = aggregate(rows, counts)
+        total += len(rows)
+    if counts:
+        add_counts(cursor, backend, counts)
+    cursor.execute("UPDATE rollup_state SET last_id = %s WHERE name = 'attendance'", (last_id,))
+    return total
+
+
+def rebuild(conn, backend, chunk_size=REBUILD_CHUNK):
+    """Recompute every rollup from the attendance table; returns the rows counted"""
+    cursor = conn.cursor()
+    try:
+        total = fill_rollups(cursor, backend, chunk_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return total
+
+
+def parse_month(text):
+    """First day of a YYYY-MM month; raises ValueError"""
+    return datetime.strptime(text, "%Y-%m").date()
+
+
+def month_range(month):
+    """(first day, last day) of month, or the whole history for None"""
+    if month is None:
+        # The DATE range MySQL supports
+        return date(1000, 1, 1), date(9999, 12, 31)
+    following = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+    return month, date.fromordinal(following.toordinal() - 1)
+
+
+def percent(part, whole):
+    return round(100.0 * part / whole, 1) if whole else 0.0
+
+
+# Columns of each summary view, for the viewer and exports
+SUMMARY_COLUMNS = {
+    "students": ["Student ID", "Name", "Department", "Days Present", "Class Days", "Attendance %"],
+    "departments": ["Department", "Students", "Days Held", "Present", "Attendance %"],
+    "daily": ["Date", "Department", "Present", "Students", "Attendance %"],
+}
+
+
+def student_summary(cursor, month=None, student_ids=None):
+    """Days present per student against the days any attendance was taken"""
+    first, last = month_range(month)
+    cursor.execute("SELECT COUNT(DISTINCT day) FROM attendance_daily WHERE day BETWEEN %s AND %s",
+                   (first, last))
+    class_days = cursor.fetchone()[0]
+    query = """
+        SELECT m.student_id, s.name, s.department, SUM(m.days_present)
+        FROM attendance_monthly_student m
+        LEFT JOIN students s ON s.student_id = m.student_id
+        WHERE m.month BETWEEN %s AND %s
+    """
+    query += " GROUP BY m.student_id, s.name, s.department ORDER BY m.student_id"
+    cursor.execute(query, (first.replace(day=1), last))
+    # At most one row per student, so the search filter is applied here
+    wanted = None if student_ids is None else set(student_ids)
+    # MySQL returns SUM() as Decimal
+    return [(student_id, name, department, int(days), class_days, percent(int(days), class_days))
+            for student_id, name, department, days in cursor.fetchall()
+            if wanted is None or student_id in wanted]
+
+
+def enrolled_by_department(cursor):
+    cursor.execute("SELECT COALESCE(department, ''), COUNT(*) FROM students GROUP BY COALESCE(department, '')")
+    return dict(cursor.fetchall())
+
+
+def department_summary(cursor, month=None, departments=None):
+    """Student-days present per department against enrolled students x days held"""
+    first, last = month_range(month)
+    cursor.execute("""
+        SELECT department, COUNT(*) FROM attendance_daily
+        WHERE day BETWEEN %s AND %s GROUP BY department
+    """, (first, last))
+    days_held = dict(cursor.fetchall())
+    cursor.execute("""
+        SELECT department, SUM(present) FROM attendance_monthly_department
+        WHERE month BETWEEN %s AND %s GROUP BY department ORDER BY department
+    """, (first.replace(day=1), last))
+    present = cursor.fetchall()
+    enrolled = enrolled_by_department(cursor)
+    rows = []
+    for department, count in present:
+        if departments is not None and department not in departments:
+            continue
+        students, days, count = enrolled.get(department, 0), days_held.get(department, 0), int(count)
+        rows.append((department, students, days, count, percent(count, students * days)))
+    return rows
+
+
+def daily_summary(cursor, month=None, departments=None):
+    """Students present per department per day, newest first"""
+    first, last = month_range(month)
+    enrolled = enrolled_by_department(cursor)
+    cursor.execute("""
+        SELECT day, department, present FROM attendance_daily
+        WHERE day BETWEEN %s AND %s ORDER BY day DESC, department
+    """, (first, last))
+    return [(day, department, present, enrolled.get(department, 0),
+             percent(present, enrolled.get(department, 0)))
+            for day, department, present in cursor.fetchall()
+            if departments is None or department in departments]
+
+
+def summary(view, month=None, name=None, department=None, search=None):
+    """(columns, rows) of a summary view, read from the rollup tables only
+
+    name and department narrow the view like the raw attendance filter.
+    """
+    from data_access import connect
+    from student_search import StudentSearch, normalize
+
+    search = search or StudentSearch()
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        try:
+            if view == "students":
+                rows = student_summary(cursor, month, search.matching_ids(name, department))
+            else:
+                departments = None
+                if department:
+                    enrolled = enrolled_by_department(cursor)
+                    departments = {d for d in enrolled if normalize(department) in normalize(d)}
+                summarize = department_summary if view == "departments" else daily_summary
+                rows = summarize(cursor, month, departments)
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+    return SUMMARY_COLUMNS[view], rows
+
+
+def main():
+    from data_access import connect, get_database
+
+    parser = argparse.ArgumentParser(description="Attendance rollup tables and summaries")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from attendance")
+    parser.add_argument("--summary", choices=list(SUMMARY_COLUMNS), help="Print a summary view")
+    parser.add_argument("--month", help="Limit the summary to one month (YYYY-MM)")
+    parser.add_argument("--department", help="Department contains")
+    parser.add_argument("--output", help="Export the summary to .xlsx or .csv instead of printing it")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = connect()
+        try:
+            started = time.perf_counter()
+            total = rebuild(conn, get_database().backend)
+        finally:
+            conn.close()
+        print(f"Rolled up {total} attendance rows in {time.perf_counter() - started:.2f}s")
+
+    if args.summary:
+        try:
+            month = parse_month(args.month) if args.month else None
+        except ValueError:
+            parser.error("--month must be YYYY-MM")
+        started = time.perf_counter()
+        columns, rows = summary(args.summary, month, department=args.department)
+        elapsed = (time.perf_counter() - started) * 1000
+        if args.output:
+            from attendance_report import export_rows
+            export_rows(rows, args.output, columns)
+            print(f"Wrote {len(rows)} rows to {args.output} ({elapsed:.1f} ms)")
+            return
+        print("  ".join(columns))
+        for row in rows:
+            print("  ".join(str(v) for v in row))
+        print(f"{len(rows)} rows in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
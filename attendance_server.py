@@ -0,0 +1,381 @@
+import argparse
+import multiprocessing as mp
+import queue
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+
+import cv2
+from data_access import connect
+import numpy as np
+
+from face_matcher import GalleryMatcher
+from gallery_snapshot import gallery_marker, load_gallery_cached
+from gallery_reload import GalleryReloader
+from face_index import make_index
+from attendance_writer import AttendanceWriter
+from station_metrics import MetricsExporter, StationMetrics
+
+
+# Seconds before a camera process sends the same student again; the parent
+# dedupes per day, so a student whose write failed is picked up on a later send
+RESEND_INTERVAL = 10.0
+
+
+def parse_source(source):
+    """Device indices arrive as strings on the command line"""
+    return int(source) if source.isdigit() else source
+
+
+def share_gallery(encodings):
+    """Copy the gallery matrix into a shared memory block; return (block, spec)"""
+    matrix = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+    block = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    shared = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=block.buf)
+    shared[:] = matrix
+    return block, (block.name, matrix.shape, matrix.dtype.str)
+
+
+def attach_gallery(spec):
+    """Map the shared gallery read-only inside a worker process"""
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    matrix = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    matrix.flags.writeable = False
+    return block, matrix
+
+
+def camera_worker(source, gallery_spec, student_ids, names, events, stop, options):
+    """Worker process entry point: map the shared gallery and serve one source"""
+    block, matrix = attach_gallery(gallery_spec)
+    try:
+        run_source(source, matrix, student_ids, names, events, stop, options)
+    finally:
+        # The matcher built on the shared view is gone once run_source returns
+        del matrix
+        block.close()
+
+
+def run_source(source, matrix, student_ids, names, events, stop, options):
+    """Recognize faces from one video source and send attendance events to the writer"""
+    # Imported here so the parent process never loads dlib
+    from face_recognizer import FaceRecognizer
+    from face_detectors import make_detector
+    from face_tracker import TrackingRecognizer
+    from adaptive_detection import AdaptiveRecognizer
+    from motion_gate import MotionGatedRecognizer
+    from attendance_pipeline import LatestFrameGrabber
+
+    index = make_index(options["index_type"], **options["index_options"])
+    matcher = GalleryMatcher(matrix, student_ids, names,
+                             tolerance=options["tolerance"], index=index)
+    if options["index_options"]:
+        # The parent's layout only fits the shared matrix; later rebuilds train their own
+        index.layout = None
+    # Sent to the parent periodically when metrics are exported
+    metrics = StationMetrics({"source": source})
+    recognizer = FaceRecognizer(matcher, detector=make_detector(options["detector"]),
+                                metrics=metrics)
+    face_recognizer = recognizer
+    if options["adaptive"]:
+        recognizer = AdaptiveRecognizer(recognizer, options["entry_zones"])
+    if options["tracking"]:
+        recognizer = TrackingRecognizer(recognizer, options["detect_every"])
+    if options["motion_gate"]:
+        recognizer = MotionGatedRecognizer(recognizer)
+        metrics.watch("frames_skipped", lambda: recognizer.gate.skipped, counter=True)
+
+    capture = cv2.VideoCapture(parse_source(source))
+    if not capture.isOpened():
+        events.put(("error", source, "Could not open video source"))
+        return
+
+    # Each worker applies gallery changes on top of the shared base on its own
+    reloader = None
+    if options["reload_interval"]:
+        def set_matcher(updated):
+            face_recognizer.matcher = updated
+        reloader = GalleryReloader(connect,
+                                   lambda: face_recognizer.matcher, set_matcher,
+                                   options["marker"], options["reload_interval"])
+        reloader.start()
+
+    # Live sources only ever process the newest frame; files are read in order
+    live = isinstance(parse_source(source), int) or "://" in source
+    grabber = LatestFrameGrabber(capture) if live else None
+    if grabber:
+        grabber.start()
+
+    last_sent = {}  # student_id -> monotonic time of the last event sent
+    frames = 0
+    last_seq = 0
+    started = time.perf_counter()
+    last_report = started
+    while not stop.is_set():
+        if grabber:
+            last_seq, _, frame = grabber.wait_newer(last_seq)
+            if grabber.failed:
+                break
+            if frame is None:
+                continue
+        else:
+            ret, frame = capture.read()
+            if not ret:
+                break
+
+        frames += 1
+        frame_started = time.perf_counter()
+        detections = recognizer.recognize(frame)
+        metrics.observe("recognize", (time.perf_counter() - frame_started) * 1000.0)
+        metrics.frame()
+        metrics.faces(detections)
+        if options["metrics"] and frame_started - last_report >= 2.0:
+            last_report = frame_started
+            events.put(("metrics", source, metrics.snapshot()))
+
+        for detection in detections:
+            if not detection.match.is_match:
+                continue
+            now = datetime.now()
+            student_id = detection.match.student_ids[0]
+            # Avoid flooding the parent with the same student every frame
+            sent = time.monotonic()
+            if sent - last_sent.get(student_id, float("-inf")) < RESEND_INTERVAL:
+                continue
+            last_sent[student_id] = sent
+            events.put(("attendance", source, student_id, detection.match.names[0], now))
+
+    if grabber:
+        grabber.stop()
+    if reloader:
+        reloader.stop()
+    capture.release()
+    elapsed = time.perf_counter() - started
+    if options["metrics"]:
+        events.put(("metrics", source, metrics.snapshot()))
+    skipped = recognizer.gate.skipped if options["motion_gate"] else 0
+    events.put(("done", source, frames, frames / elapsed if elapsed else 0.0, skipped))
+
+
+class AttendanceServer:
+    """Run one recognition process per source and write attendance from a single writer"""
+
+    def __init__(self, sources, options):
+        self.sources = sources
+        self.options = options
+        self.today_attendance = {}
+
+        # Latest metrics snapshot from each camera process, plus the writer's own
+        self.metrics = StationMetrics({"source": "writer"})
+        self.snapshots = {}
+        self.snapshots_lock = threading.Lock()
+
+    def collect_metrics(self):
+        with self.snapshots_lock:
+            snapshots = list(self.snapshots.values())
+        return snapshots + [self.metrics.snapshot()]
+
+    def db_connect(self):
+        self.db = connect()
+        self.cursor = self.db.cursor()
+
+    def already_marked(self, student_id, day):
+        """Students already present on day, loaded once per day"""
+        if day not in self.today_attendance:
+            self.cursor.execute("SELECT student_id FROM attendance WHERE date = %s", (day,))
+            self.today_attendance = {day: {row[0] for row in self.cursor.fetchall()}}
+        return student_id in self.today_attendance[day]
+
+    def mark_attendance(self, student_id, name, when, source):
+        """Queue attendance for the single writer shared by all sources"""
+        if self.already_marked(student_id, when.date()):
+            return
+        self.today_attendance[when.date()].add(student_id)
+        self.writer.submit(student_id, f"{name} [{source}]", when)
+
+    def report_written(self):
+        while True:
+            try:
+                student_id, name, when = self.writer.written.get_nowait()
+            except queue.Empty:
+                break
+            print(f"Attendance marked for {name} ({student_id}) at {when.time()}")
+        while True:
+            try:
+                batch, err = self.writer.failed.get_nowait()
+            except queue.Empty:
+                break
+            for student_id, _, when in batch:
+                # Allow the student to be recognized and submitted again; the
+                # day may already have been replaced by the next one
+                self.today_attendance.get(when.date(), set()).discard(student_id)
+            print(f"Error marking attendance for {len(batch)} students: {err}")
+
+    def run(self):
+        self.db_connect()
+        self.options["marker"] = gallery_marker(self.cursor)
+        encodings, student_ids, names = load_gallery_cached(self.cursor, marker=self.options["marker"])
+        if not len(encodings):
+            print("No face data loaded. Register students first.")
+            return
+
+        block, spec = share_gallery(encodings)
+        # Train the IVF index once here; workers reuse its layout on the shared matrix
+        self.options["index_options"] = {}
+        if self.options["index_type"] == "ivf":
+            layout = make_index("ivf").build(np.asarray(encodings, dtype=np.float32)).get_layout()
+            self.options["index_options"] = {"layout": layout}
+        del encodings
+        self.writer = AttendanceWriter(connect,
+                                       metrics=self.metrics)
+        self.writer.start()
+        exporter = None
+        if self.options["metrics"]:
+            exporter = MetricsExporter(self.collect_metrics, port=self.options["metrics_port"],
+                                       path=self.options["metrics_file"])
+            exporter.start()
+        ctx = mp.get_context("spawn")
+        events = ctx.Queue()
+        stop = ctx.Event()
+        workers = [
+            ctx.Process(target=camera_worker, name=f"camera-{i}",
+                        args=(source, spec, student_ids, names, events, stop, self.options))
+            for i, source in enumerate(self.sources)
+        ]
+        try:
+            for worker in workers:
+                worker.start()
+            print(f"Serving {len(workers)} source(s) with {len(student_ids)} enrolled students")
+
+            # Single writer loop: runs until every worker has exited and the queue is drained
+            while any(worker.is_alive() for worker in workers) or not events.empty():
+                self.report_written()
+                try:
+                    event = events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self.handle_event(event)
+        except KeyboardInterrupt:
+            print("Stopping...")
+            stop.set()
+            for worker in workers:
+                worker.join(timeout=5)
+            while True:
+                try:
+                    self.handle_event(events.get_nowait())
+                except queue.Empty:
+                    break
+        finally:
+            self.writer.stop()
+            self.report_written()
+            if exporter:
+                exporter.stop()
+            block.close()
+            block.unlink()
+            self.db.close()
+
+    def handle_event(self, event):
+        kind, source = event[0], event[1]
+        if kind == "attendance":
+            _, _, student_id, name, when = event
+            self.mark_attendance(student_id, name, when, source)
+        elif kind == "metrics":
+            with self.snapshots_lock:
+                self.snapshots[source] = event[2]
+        elif kind == "done":
+            print(f"[{source}] Finished: {event[2]} frames at {event[3]:.1f} FPS, "
+                  f"{event[4]} skipped by the motion gate")
+        elif kind == "error":
+            print(f"[{source}] {event[2]}")
+
+
+def serve_mjpeg(path, port):
+    """Local stand-in for a network camera: loop a video file as an MJPEG stream"""
+
+    class StreamHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.end_headers()
+            capture = cv2.VideoCapture(path)
+            delay = 1.0 / (capture.get(cv2.CAP_PROP_FPS) or 25.0)
+            try:
+                while True:
+                    ret, frame = capture.read()
+                    if not ret:
+                        capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+                    self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                     + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                                     + jpeg + b"\r\n")
+                    time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                capture.release()
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StreamHandler)
+    print(f"Streaming {path} at http://127.0.0.1:{port}/stream.mjpg")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-camera attendance server")
+    parser.add_argument("sources", nargs="*",
+                        help="Device indices, video files or stream URLs")
+    parser.add_argument("--index", default="exact", choices=["exact", "ivf"],
+                        help="Gallery index type")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--detector", default="hog",
+                        help="Face detector backend (hog, haar, lbp, haar+hog, lbp+hog)")
+    parser.add_argument("--tracking", action="store_true",
+                        help="Detect every N frames and track faces in between")
+    parser.add_argument("--detect-every", type=int, default=5)
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Search around recent faces and entry zones at an adaptive scale")
+    parser.add_argument("--entry-zone", action="append", default=[], metavar="X0,Y0,X1,Y1",
+                        help="Entry zone as fractions of the frame; may be repeated")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false",
+                        help="Run detection on every frame, even when nothing moves")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="Seconds between checks for gallery changes (0 disables)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file",
+                        help="Write Prometheus metrics to this file every few seconds")
+    parser.add_argument("--standin", metavar="VIDEO",
+                        help="Instead of serving attendance, stream VIDEO as MJPEG for testing")
+    parser.add_argument("--port", type=int, default=8081, help="Port for --standin")
+    args = parser.parse_args()
+
+    if args.standin:
+        serve_mjpeg(args.standin, args.port)
+        return
+    if not args.sources:
+        parser.error("at least one source is required")
+
+    options = {
+        "index_type": args.index,
+        "tolerance": args.tolerance,
+        "detector": args.detector,
+        "tracking": args.tracking,
+        "detect_every": args.detect_every,
+        "reload_interval": args.reload_interval,
+        "adaptive": args.adaptive,
+        "motion_gate": args.motion_gate,
+        "metrics": bool(args.metrics_port or args.metrics_file),
+        "metrics_port": args.metrics_port,
+        "metrics_file": args.metrics_file,
+        "entry_zones": [tuple(float(v) for v in zone.split(",")) for zone in args.entry_zone],
+    }
+    AttendanceServer(args.sources, options).run()
+
+
+if __name__ == "__main__":
+    main()
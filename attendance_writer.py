@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+
+import attendance_rollups
+from data_access import Error, IntegrityError, OperationalError
+
+# Lock wait timeout and deadlock: the transaction can simply be retried
+TRANSIENT_ERRNOS = {1205, 1213}
+
+INSERT_ATTENDANCE = "INSERT INTO attendance (student_id, date, time) VALUES (%s, %s, %s)"
+
+
+def insert_sql(backend):
+    """INSERT that skips only rows duplicating the UNIQUE (student_id, date) key
+
+    Retried or repeated events never create a second row. Unlike INSERT
+    IGNORE, other errors, such as a student_id with no students row, still
+    raise instead of dropping the row with a warning on MySQL.
+    """
+    if backend == "sqlite":
+        return INSERT_ATTENDANCE + " ON CONFLICT (student_id, date) DO NOTHING"
+    return INSERT_ATTENDANCE + " ON DUPLICATE KEY UPDATE id = id"
+
+
+def insert_attendance(cursor, backend, rows, rollups):
+    """Insert (student_id, date, time) rows in the caller's transaction, which the caller commits
+
+    Every attendance insert goes through here. With rollups the rollup lock
+    is taken before inserting and the new rows are counted before returning,
+    so ids are rolled up in commit order; an insert without the lock could
+    commit below the rollup watermark and never be counted.
+    """
+    if rollups:
+        last_id = attendance_rollups.lock(cursor)
+    cursor.executemany(insert_sql(backend), rows)
+    if rollups:
+        attendance_rollups.roll_up_new_rows(cursor, backend, last_id)
+
+
+def is_transient(err):
+    """True for errors where retrying the same batch later can succeed"""
+    if isinstance(err, OperationalError):
+        return True
+    return getattr(err, "errno", None) in TRANSIENT_ERRNOS
+
+
+class AttendanceWriter:
+    """Buffer attendance events and insert them in batches on a background thread
+
+    Events are flushed with one executemany per batch inside a single
+    transaction, when batch_size events are waiting or flush_interval seconds
+    have passed. Transient database errors roll back and retry the same batch
+    on a fresh connection with backoff, so no event is lost while the database
+    is unavailable. A batch with a row the database rejects, such as a student
+    deleted since the gallery was loaded, is written again one event at a
+    time, so only the rejected events go to the failed queue. Committed events
+    are published on the written queue.
+
+    With rollups, the attendance rollup tables are brought up to date in
+    the same transaction as each batch.
+    """
+
+    def __init__(self, connect, batch_size=50, flush_interval=0.5,
+                 max_backoff=30.0, max_failures=5, metrics=None, rollups=True):
+        self.connect = connect
+        self.metrics = metrics
+        self.rollups = rollups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+
+        self.pending = queue.Queue()
+        # (student_id, name, when) for every committed event, for the UI to report
+        self.written = queue.Queue()
+        # (events, error) for rejected rows and batches dropped after repeated errors
+        self.failed = queue.Queue()
+
+        self.conn = None
+        # Whether the database has the rollup tables, checked per connection
+        self.rollups_ready = False
+        self.running = False
+        self.thread = None
+        if metrics:
+            metrics.watch("writer_queue", self.queue_depth)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush what is buffered, then stop the writer thread"""
+        self.flush(timeout)
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        if self.conn:
+            try:
+                self.conn.close()
+            except Error:
+                pass
+            self.conn = None
+
+    def submit(self, student_id, name, when):
+        """Queue an attendance event; returns immediately"""
+        self.pending.put((student_id, name, when))
+
+    def flush(self, timeout=5.0):
+        """Wait until every submitted event has been written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.pending.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def queue_depth(self):
+        return self.pending.qsize()
+
+    def _next_batch(self):
+        """Collect up to batch_size events, waiting at most flush_interval after the first"""
+        try:
+            batch = [self.pending.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running or self.pending.unfinished_tasks:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            self._write(batch)
+            for _ in batch:
+                self.pending.task_done()
+
+    def _write(self, batch):
+        """Insert one batch, retrying until it commits"""
+        rows = [(student_id, when.date(), when.time()) for student_id, _, when in batch]
+        backoff = 0.5
+        failures = 0
+        while True:
+            try:
+                if self.conn is None:
+                    self.conn = self.connect()
+                    self.rollups_ready = self.rollups and attendance_rollups.available(self.conn)
+                cursor = self.conn.cursor()
+                started = time.perf_counter()
+                try:
+                    insert_attendance(cursor, self.conn.backend, rows, self.rollups_ready)
+                    self.conn.commit()
+                finally:
+                    cursor.close()
+                if self.metrics:
+                    self.metrics.observe("db_write", (time.perf_counter() - started) * 1000.0)
+                    self.metrics.count("attendance_written", len(batch))
+                for event in batch:
+                    self.written.put(event)
+                return
+            except IntegrityError as err:
+                # Retrying cannot help; find the offending rows and keep the rest
+                if self.metrics:
+                    self.metrics.count("db_errors")
+                self._discard_connection()
+                if len(batch) == 1:
+                    self.failed.put((batch, err))
+                    return
+                for event in batch:
+                    self._write([event])
+                return
+            except Error as err:
+                if self.metrics:
+                    self.metrics.count("db_errors")
+                self._discard_connection()
+                if not is_transient(err):
+                    failures += 1
+                    if failures >= self.max_failures:
+                        self.failed.put((batch, err))
+                        return
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _discard_connection(self):
+        """Roll back and drop the connection so the next attempt starts clean"""
+        if self.conn is None:
+            return
+        try:
+            self.conn.rollback()
+            self.conn.close()
+        except Error:
+            pass
+        self.conn = None
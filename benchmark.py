@@ -0,0 +1,297 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import cv2
+import face_recognition
+import numpy as np
+
+from face_detectors import make_detector
+from face_index import make_index, synthetic_gallery
+from face_matcher import GalleryMatcher
+from face_recognizer import Detection, FaceRecognizer, draw_detections
+from face_store import DATASET_PATH, FaceImageStore
+
+# Stages in the order a frame passes through them
+STAGES = ["capture", "resize", "convert", "detect", "encode", "match", "render", "db_insert"]
+
+
+class StageTimer:
+    """Collect wall-clock samples per named stage"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def time(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples[stage].append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def summary(self):
+        """count, mean and percentiles in milliseconds for every stage"""
+        report = {}
+        for stage, values in self.samples.items():
+            values = np.asarray(values)
+            report[stage] = {
+                "count": int(len(values)),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+            }
+        return report
+
+
+def load_frames(dataset):
+    """(student_id, encoded jpeg bytes) for every stored face image"""
+    frames = []
+    for student_id, path in FaceImageStore(dataset).all_images():
+        with open(path, "rb") as f:
+            frames.append((student_id, np.frombuffer(f.read(), dtype=np.uint8)))
+    return frames
+
+
+def composite(images, columns):
+    """Tile BGR images into one frame, several faces per frame"""
+    height, width = images[0].shape[:2]
+    tiles = [cv2.resize(image, (width, height)) for image in images]
+    while len(tiles) % columns:
+        tiles.append(np.zeros_like(tiles[0]))
+    rows = [np.hstack(tiles[i:i + columns]) for i in range(0, len(tiles), columns)]
+    return np.vstack(rows)
+
+
+def build_gallery(frames, gallery_size, detector):
+    """One averaged encoding per student in the dataset, padded with synthetic students"""
+    per_student = defaultdict(list)
+    for student_id, data in frames:
+        rgb = cv2.cvtColor(cv2.imdecode(data, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        locations = detector.detect(rgb)
+        if locations:
+            per_student[student_id].append(face_recognition.face_encodings(rgb, locations[:1])[0])
+
+    student_ids = sorted(per_student)
+    encodings = [np.mean(per_student[s], axis=0) for s in student_ids]
+    names = list(student_ids)
+    if gallery_size > len(student_ids):
+        extra = gallery_size - len(student_ids)
+        encodings += list(synthetic_gallery(extra, seed=1).astype(np.float64))
+        student_ids += [f"synthetic-{i}" for i in range(extra)]
+        names += [f"Synthetic {i}" for i in range(extra)]
+    return np.asarray(encodings), student_ids, names
+
+
+class Benchmark:
+    """Replay frames through the same stages a station runs, timing each one"""
+
+    def __init__(self, recognizer, display_size=(640, 480), db_connect=None):
+        self.recognizer = recognizer
+        self.display_size = display_size
+        self.db_connect = db_connect
+        self.rollups = False
+        self.display = np.empty((display_size[1], display_size[0], 3), dtype=np.uint8)
+        self.timer = StageTimer()
+        self.end_to_end = []
+        self.faces = 0
+
+    def render(self, frame, detections):
+        """The preview path without Tk: resize into a reused buffer, convert, draw"""
+        cv2.resize(frame, self.display_size, dst=self.display, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.display, cv2.COLOR_BGR2RGB, dst=self.display)
+        draw_detections(self.display, detections, scale=self.display_size[0] / frame.shape[1])
+
+    def insert(self, conn, detections):
+        """Insert attendance for the recognized faces, as the writer does, and roll it back"""
+        from attendance_writer import insert_attendance
+
+        now = datetime.now()
+        rows = [(d.match.student_ids[0], now.date(), now.time()) for d in detections
+                if d.match.is_match]
+        cursor = conn.cursor()
+        try:
+            if rows:
+                insert_attendance(cursor, conn.backend, rows, self.rollups)
+        finally:
+            conn.rollback()
+            cursor.close()
+
+    def run_frame(self, data, conn=None):
+        timer = self.timer
+        recognizer = self.recognizer
+        start = time.perf_counter()
+
+        frame = timer.time("capture", cv2.imdecode, data, cv2.IMREAD_COLOR)
+        small = timer.time("resize", cv2.resize, frame, (0, 0), None,
+                           recognizer.scale, recognizer.scale)
+        small = timer.time("convert", cv2.cvtColor, small, cv2.COLOR_BGR2RGB)
+        locations = timer.time("detect", recognizer.detector.detect, small)
+        detections = []
+        if locations:
+            encodings = timer.time("encode", face_recognition.face_encodings, small, locations)
+            matches = timer.time("match", recognizer.matcher.match, encodings)
+            detections = [Detection(recognizer.to_frame(l), m) for l, m in zip(locations, matches)]
+        timer.time("render", self.render, frame, detections)
+        if conn is not None:
+            timer.time("db_insert", self.insert, conn, detections)
+
+        self.end_to_end.append((time.perf_counter() - start) * 1000.0)
+        self.faces += len(detections)
+
+    def run(self, frames, repeat=1, warmup=1):
+        conn = self.db_connect() if self.db_connect else None
+        if conn is not None:
+            from attendance_rollups import available
+            self.rollups = available(conn)
+        try:
+            for data in frames[:warmup]:
+                self.run_frame(data, conn)
+            self.timer = StageTimer()
+            self.end_to_end = []
+            self.faces = 0
+            for _ in range(repeat):
+                for data in frames:
+                    self.run_frame(data, conn)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def report(self):
+        values = np.asarray(self.end_to_end)
+        total = values.sum() / 1000.0
+        return {
+            "stages": self.timer.summary(),
+            "end_to_end": {
+                "frames": int(len(values)),
+                "faces": self.faces,
+                "fps": len(values) / total if total else 0.0,
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+            },
+        }
+
+
+def compare_to_baseline(results, baseline, threshold, min_delta_ms):
+    """Regressions as (scenario, stage, baseline p50, current p50)
+
+    A stage regresses when its p50 grew by more than threshold (a fraction)
+    and by more than min_delta_ms, so sub-millisecond noise never fails a run.
+    """
+    regressions = []
+    for scenario, report in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+        pairs = [(stage, old["stages"][stage]["p50_ms"], stats["p50_ms"])
+                 for stage, stats in report["stages"].items() if stage in old["stages"]]
+        pairs.append(("end_to_end", old["end_to_end"]["p50_ms"], report["end_to_end"]["p50_ms"]))
+        for stage, before, now in pairs:
+            if now > before * (1.0 + threshold) and now - before > min_delta_ms:
+                regressions.append((scenario, stage, before, now))
+    return regressions
+
+
+def print_report(results):
+    for scenario, report in results["scenarios"].items():
+        e2e = report["end_to_end"]
+        print(f"\n{scenario}: {e2e['frames']} frames, {e2e['faces']} faces, "
+              f"{e2e['fps']:.1f} fps end to end (p50 {e2e['p50_ms']:.1f} ms, p95 {e2e['p95_ms']:.1f} ms)")
+        print(f"  {'stage':<10} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+        for stage in STAGES:
+            stats = report["stages"].get(stage)
+            if stats:
+                print(f"  {stage:<10} {stats['count']:>6} {stats['mean_ms']:>8.2f} {stats['p50_ms']:>8.2f} "
+                      f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the recognition pipeline")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Face dataset directory")
+    parser.add_argument("--faces", default="1,4", help="Faces per frame for each scenario; "
+                        "more than 1 builds synthetic composites from dataset images")
+    parser.add_argument("--composites", type=int, default=20, help="Composite frames per scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the frames")
+    parser.add_argument("--scale", type=float, default=0.25, help="Downscale before detection")
+    parser.add_argument("--detector", default="hog", help="Face detector backend")
+    parser.add_argument("--index", default="exact", choices=["exact", "ivf"])
+    parser.add_argument("--gallery-size", type=int, default=0,
+                        help="Pad the gallery with synthetic students up to this size")
+    parser.add_argument("--db", action="store_true",
+                        help="Also time attendance inserts (rolled back) against the database")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Fail if a stage regressed against this results file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed p50 slowdown as a fraction of the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    frames = load_frames(args.dataset)
+    if not frames:
+        print("No images found")
+        return 1
+
+    detector = make_detector(args.detector)
+    encodings, student_ids, names = build_gallery(frames, args.gallery_size, detector)
+    matcher = GalleryMatcher(encodings, student_ids, names, index=make_index(args.index))
+    recognizer = FaceRecognizer(matcher, scale=args.scale, detector=detector)
+
+    db_connect = None
+    if args.db:
+        from data_access import connect
+        db_connect = connect
+
+    rng = np.random.default_rng(0)
+    images = [cv2.imdecode(data, cv2.IMREAD_COLOR) for _, data in frames]
+    results = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            "opencv": cv2.__version__,
+            "detector": args.detector,
+            "index": args.index,
+            "scale": args.scale,
+            "gallery_size": len(student_ids),
+        },
+        "scenarios": {},
+    }
+    for faces in (int(n) for n in args.faces.split(",")):
+        if faces <= 1:
+            replay = [data for _, data in frames]
+        else:
+            columns = int(np.ceil(np.sqrt(faces)))
+            replay = []
+            for _ in range(args.composites):
+                picks = rng.choice(len(images), size=faces, replace=len(images) < faces)
+                _, data = cv2.imencode(".jpg", composite([images[i] for i in picks], columns))
+                replay.append(data.ravel())
+        bench = Benchmark(recognizer, db_connect=db_connect)
+        bench.run(replay, args.repeat)
+        results["scenarios"][f"{faces}_faces"] = bench.report()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta_ms)
+        for scenario, stage, before, now in regressions:
+            print(f"REGRESSION {scenario}/{stage}: p50 {before:.2f} ms -> {now:.2f} ms")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
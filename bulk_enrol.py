@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import time
+
+import cv2
+from data_access import Error, connect
+import numpy as np
+
+from face_store import DATASET_PATH, FaceImageStore
+from embedding_format import encode_embedding
+
+CACHE_NAME = "encodings.cache.npz"
+
+
+class EncodingCache:
+    """Encodings of stored images keyed by a hash of the image bytes and the encoding settings
+
+    Images whose content and settings are unchanged since the last run are
+    not decoded or encoded again. Images with no detectable face are cached
+    too, so they are not retried on every run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # key -> encoding, or None when no face was found
+        self.dirty = False
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                for key, found, encoding in zip(data["keys"], data["found"], data["encodings"]):
+                    self.entries[str(key)] = encoding if found else None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        return self.entries[key]
+
+    def put(self, key, encoding):
+        self.entries[key] = encoding
+        self.dirty = True
+
+    def prune(self, live_keys):
+        """Forget images that no longer exist"""
+        for key in set(self.entries) - set(live_keys):
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        keys = list(self.entries)
+        found = np.array([self.entries[k] is not None for k in keys], dtype=bool)
+        encodings = np.zeros((len(keys), 128), dtype=np.float64)
+        for i, key in enumerate(keys):
+            if found[i]:
+                encodings[i] = self.entries[key]
+        # np.savez adds .npz unless the name already ends with it
+        tmp_path = f"{self.path[:-4]}.tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), found=found, encodings=encodings)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def image_key(path, settings):
+    """Hash of the image content plus the settings that affect its encoding"""
+    digest = hashlib.sha1(settings.encode("utf-8"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Per-process detector and settings for the pool workers
+_detector = None
+_jitters = 1
+
+
+def _init_worker(detector, jitters):
+    global _detector, _jitters
+    from face_detectors import make_detector
+    _detector = make_detector(detector)
+    _jitters = jitters
+
+
+def _encode(item):
+    """Encode the largest face in one image; returns (key, encoding or None)"""
+    import face_recognition
+
+    key, path = item
+    image = cv2.imread(path)
+    if image is None:
+        return key, None
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    locations = _detector.detect(rgb)
+    if not locations:
+        return key, None
+    largest = max(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+    return key, face_recognition.face_encodings(rgb, [largest], num_jitters=_jitters)[0]
+
+
+class BulkEnroller:
+    """Rebuild students' face encodings from the images in the face store"""
+
+    def __init__(self, store, cache, detector="hog", jitters=1, workers=1):
+        self.store = store
+        self.cache = cache
+        self.detector = detector
+        self.jitters = jitters
+        self.workers = workers
+
+        self.images = 0
+        self.cache_hits = 0
+        self.no_face = 0
+
+    def encode_all(self, student_ids=None):
+        """student_id -> averaged encoding, like capture_face stores"""
+        settings = f"{self.detector}:{self.jitters}"
+        keys = {}  # student_id -> [key]
+        todo = []
+        for student_id, path in self.store.all_images():
+            if student_ids and student_id not in student_ids:
+                continue
+            key = image_key(path, settings)
+            keys.setdefault(student_id, []).append(key)
+            self.images += 1
+            if key in self.cache:
+                self.cache_hits += 1
+            else:
+                todo.append((key, path))
+
+        if todo:
+            if self.workers <= 1:
+                _init_worker(self.detector, self.jitters)
+                results = map(_encode, todo)
+                self._store_results(results)
+            else:
+                with mp.get_context("spawn").Pool(self.workers, initializer=_init_worker,
+                                                  initargs=(self.detector, self.jitters)) as pool:
+                    self._store_results(pool.imap_unordered(_encode, todo, chunksize=4))
+        if not student_ids:
+            self.cache.prune(key for student_keys in keys.values() for key in student_keys)
+        self.cache.save()
+
+        encodings = {}
+        for student_id, student_keys in keys.items():
+            found = [self.cache.get(k) for k in student_keys if self.cache.get(k) is not None]
+            self.no_face += len(student_keys) - len(found)
+            if found:
+                encodings[student_id] = np.mean(found, axis=0)
+        return encodings
+
+    def _store_results(self, results):
+        for key, encoding in results:
+            self.cache.put(key, encoding)
+
+
+def write_encodings(conn, encodings, batch_size=200):
+    """UPDATE students in batched transactions; returns how many rows were updated"""
+    items = sorted(encodings.items())
+    updated = 0
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(items), batch_size):
+            rows = [(encode_embedding(encoding), student_id)
+                    for student_id, encoding in items[start:start + batch_size]]
+            cursor.executemany("UPDATE students SET face_encoding=%s WHERE student_id=%s", rows)
+            updated += cursor.rowcount
+            conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode every student from the stored face images")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Face dataset directory")
+    parser.add_argument("--student", action="append", default=[],
+                        help="Only re-enrol this student; may be repeated")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Encoding processes")
+    parser.add_argument("--detector", default="hog", help="Face detector backend")
+    parser.add_argument("--jitters", type=int, default=1,
+                        help="Times each face is re-sampled when encoding")
+    parser.add_argument("--batch-size", type=int, default=200, help="Students per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Encode but do not touch the database")
+    args = parser.parse_args()
+
+    store = FaceImageStore(args.dataset)
+    cache = EncodingCache(os.path.join(args.dataset, CACHE_NAME))
+    enroller = BulkEnroller(store, cache, args.detector, args.jitters, args.workers)
+
+    started = time.perf_counter()
+    encodings = enroller.encode_all(set(args.student))
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    encoded = enroller.images - enroller.cache_hits
+    print(f"{enroller.images} images ({enroller.cache_hits} cached, {encoded} encoded, "
+          f"{enroller.no_face} without a face) in {elapsed:.2f}s: "
+          f"{enroller.images / elapsed:.1f} images/s, {encoded / elapsed:.1f} encoded/s")
+
+    if args.dry_run:
+        print(f"Would update {len(encodings)} students")
+        return
+    conn = connect()
+    try:
+        updated = write_encodings(conn, encodings, args.batch_size)
+    finally:
+        conn.close()
+    print(f"Updated {updated} of {len(encodings)} students")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+try:
+    import mysql.connector
+except ImportError:
+    # SQLite-only installs
+    mysql = None
+
+# Settings come from DEFAULT_CONFIG, then the JSON config file, then the environment
+CONFIG_PATH = os.environ.get(
+    "ATTENDANCE_DB_CONFIG", os.path.join(os.path.dirname(__file__), "db_config.json"))
+
+DEFAULT_CONFIG = {
+    "backend": "mysql",  # or "sqlite"
+    "host": "localhost",
+    "port": 3306,
+    "user": "root",
+    "password": "",  # set in db_config.json or ATTENDANCE_DB_PASSWORD
+    "database": "attendance_system",
+    "path": os.path.join(os.path.dirname(__file__), "attendance.sqlite3"),  # sqlite only
+    "pool_size": 5,
+}
+
+ENV_VARS = {
+    "backend": "ATTENDANCE_DB_BACKEND",
+    "host": "ATTENDANCE_DB_HOST",
+    "port": "ATTENDANCE_DB_PORT",
+    "user": "ATTENDANCE_DB_USER",
+    "password": "ATTENDANCE_DB_PASSWORD",
+    "database": "ATTENDANCE_DB_NAME",
+    "path": "ATTENDANCE_DB_PATH",
+    "pool_size": "ATTENDANCE_DB_POOL_SIZE",
+}
+
+# Exceptions to catch whichever backend is in use
+if mysql:
+    Error = (mysql.connector.Error, sqlite3.Error)
+    IntegrityError = (mysql.connector.IntegrityError, sqlite3.IntegrityError)
+    OperationalError = (mysql.connector.errors.OperationalError,
+                        mysql.connector.errors.InterfaceError, sqlite3.OperationalError)
+else:
+    Error = (sqlite3.Error,)
+    IntegrityError = (sqlite3.IntegrityError,)
+    OperationalError = (sqlite3.OperationalError,)
+
+
+def load_config(path=CONFIG_PATH):
+    """Database settings from the defaults, the config file (if any) and ATTENDANCE_DB_* variables"""
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+    for key, var in ENV_VARS.items():
+        if var in os.environ:
+            config[key] = os.environ[var]
+    config["port"] = int(config["port"])
+    config["pool_size"] = int(config["pool_size"])
+    return config
+
+
+# SQLite stores dates and times as text; keep the types mysql-connector returns
+# (date, timedelta for TIME, datetime) and a timestamp format that sorts as text
+def _parse_time(value):
+    hours, minutes, seconds = value.decode().split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+
+
+def _format_timedelta(value):
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(sep=" ", timespec="milliseconds"))
+sqlite3.register_adapter(time, lambda v: v.isoformat(timespec="seconds"))
+sqlite3.register_adapter(timedelta, _format_timedelta)
+sqlite3.register_converter("DATE", lambda v: date.fromisoformat(v.decode()))
+sqlite3.register_converter("TIME", _parse_time)
+sqlite3.register_converter("TIMESTAMP", lambda v: datetime.fromisoformat(v.decode()))
+
+
+@lru_cache(maxsize=256)
+def translate(sql):
+    """Rewrite the MySQL flavour used across the app (%s placeholders, INSERT IGNORE) for SQLite"""
+    return sql.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the same SQL and parameters as mysql-connector"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, rows):
+        self.cursor.executemany(translate(sql), rows)
+        return self
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class PooledConnection:
+    """A connection borrowed from a Database pool; close() gives it back"""
+
+    def __init__(self, database, raw):
+        self.database = database
+        self.backend = database.backend
+        self.raw = raw
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.raw.cursor(*args, **kwargs)
+        return SQLiteCursor(cursor) if self.database.backend == "sqlite" else cursor
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def is_connected(self):
+        return self.raw is not None
+
+    def close(self):
+        if self.raw is not None:
+            raw, self.raw = self.raw, None
+            self.database.release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class Database:
+    """Connection pool for the configured backend
+
+    connect() hands out an idle connection when there is one and opens a new
+    one otherwise, so callers never block and connection setup only happens
+    until the pool is warm. Returned connections are rolled back and kept
+    idle, up to pool_size of them.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or load_config()
+        self.backend = self.config["backend"]
+        if self.backend not in ("mysql", "sqlite"):
+            raise ValueError(f"Unknown database backend: {self.backend}")
+        self.idle = []
+        self.lock = threading.Lock()
+        self.schema_ready = False
+
+    def _open(self):
+        if self.backend == "sqlite":
+            raw = sqlite3.connect(self.config["path"], timeout=30.0,
+                                  detect_types=sqlite3.PARSE_DECLTYPES,
+                                  check_same_thread=False, cached_statements=256)
+            raw.execute("PRAGMA foreign_keys = ON")
+            raw.execute("PRAGMA journal_mode = WAL")
+            # Case- and accent-folded text for student search, which MySQL's
+            # collation gives for free
+            from student_search import normalize
+            raw.create_function("fold", 1, normalize, deterministic=True)
+            if not self.schema_ready:
+                # A fresh SQLite file gets the same tables and migrations as the MySQL setup
+                from database_setup import create_sqlite_schema
+                create_sqlite_schema(PooledConnection(self, raw))
+                self.schema_ready = True
+            return raw
+        if mysql is None:
+            raise RuntimeError("mysql-connector-python is not installed; "
+                               "set ATTENDANCE_DB_BACKEND=sqlite to use SQLite")
+        return mysql.connector.connect(
+            host=self.config["host"], port=self.config["port"], user=self.config["user"],
+            password=self.config["password"], database=self.config["database"])
+
+    def connect(self):
+        while True:
+            with self.lock:
+                raw = self.idle.pop() if self.idle else None
+            if raw is None:
+                return PooledConnection(self, self._open())
+            if self.backend == "sqlite" or raw.is_connected():
+                return PooledConnection(self, raw)
+            # Dropped by the server while idle
+            self._close(raw)
+
+    def release(self, raw):
+        try:
+            # Never hand out a connection in the middle of a transaction
+            raw.rollback()
+        except Error:
+            self._close(raw)
+            return
+        with self.lock:
+            if len(self.idle) < self.config["pool_size"]:
+                self.idle.append(raw)
+                return
+        self._close(raw)
+
+    def _close(self, raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for raw in idle:
+            self._close(raw)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """The process-wide Database for the configured backend"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+        return _database
+
+
+def connect():
+    """Borrow a pooled connection; close() returns it to the pool"""
+    return get_database().connect()
@@ -1,22 +1,73 @@
-import mysql.connector
+from data_access import Database, Error, load_config
+from schema_migrations import LATEST_VERSION, apply_migrations
+
+# Same tables as the MySQL schema below, for stations running on SQLite.
+# updated_at is kept current by a trigger instead of ON UPDATE.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id VARCHAR(20) UNIQUE,
+    name VARCHAR(100),
+    department VARCHAR(50),
+    email VARCHAR(100),
+    face_encoding BLOB,
+    updated_at TIMESTAMP NOT NULL
+        DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+
+CREATE TRIGGER IF NOT EXISTS students_updated_at
+AFTER UPDATE ON students
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE students SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')
+    WHERE id = NEW.id;
+END;
+
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id VARCHAR(20),
+    date DATE,
+    time TIME,
+    CONSTRAINT uq_attendance_student_date UNIQUE (student_id, date),
+    FOREIGN KEY (student_id) REFERENCES students(student_id)
+);
+"""
+
+def create_sqlite_schema(connection):
+    """Create the tables in a SQLite database and bring them to the latest schema version"""
+    connection.executescript(SQLITE_SCHEMA)
+    connection.commit()
+    apply_migrations(connection, "sqlite")
 
 def create_database():
+    config = load_config()
+    if config["backend"] == "sqlite":
+        # Opening a pooled connection creates the schema
+        Database(config).connect().close()
+        print(f"SQLite database ready at {config['path']} (schema version {LATEST_VERSION})")
+        return
+    
+    import mysql.connector
+    
+    connection = None
     try:
         # Connect to MySQL server (without specifying a database)
         connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="harsh@2002"
+            host=config["host"],
+            port=config["port"],
+            user=config["user"],
+            password=config["password"]
         )
         
         cursor = connection.cursor()
         
         # Create database
-        cursor.execute("CREATE DATABASE IF NOT EXISTS attendance_system")
-        print("Database 'attendance_system' created successfully")
+        name = config["database"]
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{name}`")
+        print(f"Database '{name}' created successfully")
         
         # Switch to the database
-        cursor.execute("USE attendance_system")
+        cursor.execute(f"USE `{name}`")
         
         # Create students table
         cursor.execute("""
@@ -26,7 +77,9 @@ def create_database():
                 name VARCHAR(100),
                 department VARCHAR(50),
                 email VARCHAR(100),
-                face_encoding LONGBLOB
+                face_encoding LONGBLOB,
+                updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
             )
         """)
         
@@ -37,6 +90,7 @@ def create_database():
                 student_id VARCHAR(20),
                 date DATE,
                 time TIME,
+                UNIQUE KEY uq_attendance_student_date (student_id, date),
                 FOREIGN KEY (student_id) REFERENCES students(student_id)
             )
         """)
@@ -44,10 +98,14 @@ def create_database():
         print("Tables created successfully")
         connection.commit()
         
-    except mysql.connector.Error as err:
+        # Indexes, and upgrades for tables created by older versions of this script
+        for number, description in apply_migrations(connection, "mysql"):
+            print(f"Applied migration {number}: {description}")
+        
+    except Error as err:
         print(f"Error: {err}")
     finally:
-        if connection.is_connected():
+        if connection and connection.is_connected():
             cursor.close()
             connection.close()
 
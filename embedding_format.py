@@ -0,0 +1,208 @@
+import argparse
+import struct
+import zlib
+
+import numpy as np
+
+# Blob layout: 16-byte little-endian header, then dim values of the given dtype.
+#   magic "FE", format version, dtype code, encoder id, reserved,
+#   u16 dimension, f32 int8 scale (1.0 otherwise), u32 crc32 of the values
+HEADER = struct.Struct("<2sBBBBHfI")
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+DTYPE_NAMES = {code: name for name, code in DTYPE_CODES.items()}
+
+# face_recognition / dlib ResNet, 128 dimensions
+ENCODER_DLIB_V1 = 1
+
+# float16 keeps distances within ~1e-3 of float64 at a quarter of the size
+DEFAULT_DTYPE = "float16"
+
+
+class EmbeddingFormatError(Exception):
+    """A face_encoding blob is truncated, corrupt or of an unknown version"""
+
+
+def encode_embedding(vector, dtype=DEFAULT_DTYPE, encoder=ENCODER_DLIB_V1):
+    """Pack a face encoding into a versioned, checksummed blob"""
+    vector = np.asarray(vector, dtype=np.float64).ravel()
+    code = DTYPE_CODES[dtype]
+    scale = 1.0
+    if dtype == "int8":
+        # Symmetric per-vector quantization
+        peak = float(np.abs(vector).max())
+        scale = peak / 127.0 if peak else 1.0
+        values = np.clip(np.round(vector / scale), -127, 127).astype(DTYPES[code])
+    else:
+        values = vector.astype(DTYPES[code])
+    payload = values.tobytes()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, code, encoder, 0, len(values), scale,
+                         zlib.crc32(payload))
+    return header + payload
+
+
+def read_header(blob):
+    """(dtype name, encoder, dim) of a blob in this format, or None for a legacy float64 blob"""
+    if len(blob) < HEADER.size or bytes(blob[:2]) != MAGIC:
+        return None
+    magic, version, code, encoder, _, dim, _, _ = HEADER.unpack_from(blob)
+    if code not in DTYPES or len(blob) != HEADER.size + dim * DTYPES[code].itemsize:
+        return None
+    return DTYPE_NAMES[code], encoder, dim
+
+
+def decode_embedding(blob):
+    """Decode a face_encoding blob from the students table into a float32 vector
+
+    Blobs without a header are the original raw float64 tobytes() format.
+    """
+    blob = bytes(blob)
+    if read_header(blob) is None:
+        if len(blob) % 8:
+            raise EmbeddingFormatError(f"Unrecognised face encoding of {len(blob)} bytes")
+        return np.frombuffer(blob, dtype=np.float64).astype(np.float32)
+
+    _, version, code, _, _, dim, scale, crc = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise EmbeddingFormatError(f"Unsupported face encoding version {version}")
+    payload = blob[HEADER.size:]
+    if zlib.crc32(payload) != crc:
+        raise EmbeddingFormatError("Face encoding checksum mismatch")
+    values = np.frombuffer(payload, dtype=DTYPES[code])
+    if code == DTYPE_CODES["int8"]:
+        return values.astype(np.float32) * np.float32(scale)
+    return values.astype(np.float32)
+
+
+def migrate(conn, dtype=DEFAULT_DTYPE, batch_size=500):
+    """Rewrite every stored encoding not already in dtype; returns (rewritten, bytes before, after)"""
+    cursor = conn.cursor()
+    rewritten = before = after = 0
+    try:
+        cursor.execute("SELECT student_id, face_encoding FROM students WHERE face_encoding IS NOT NULL")
+        rows = cursor.fetchall()
+        updates = []
+        for student_id, blob in rows:
+            header = read_header(bytes(blob))
+            if header and header[0] == dtype:
+                continue
+            new_blob = encode_embedding(decode_embedding(blob), dtype)
+            updates.append((new_blob, student_id))
+            before += len(blob)
+            after += len(new_blob)
+        for start in range(0, len(updates), batch_size):
+            cursor.executemany("UPDATE students SET face_encoding=%s WHERE student_id=%s",
+                               updates[start:start + batch_size])
+            conn.commit()
+            rewritten += len(updates[start:start + batch_size])
+    finally:
+        cursor.close()
+    return rewritten, before, after
+
+
+def nearest_float64(matrix, probe, chunk=256):
+    """(rows, distances) of the nearest gallery row for each probe, computed in float64
+
+    The reference for accuracy_check; GalleryMatcher works in float32, so it
+    cannot serve as the float64 baseline.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    probe = np.asarray(probe, dtype=np.float64)
+    norms = (matrix * matrix).sum(axis=1)
+    rows = np.empty(len(probe), dtype=np.int64)
+    for start in range(0, len(probe), chunk):
+        block = probe[start:start + chunk]
+        squared = (block * block).sum(axis=1)[:, None] + norms[None, :] - 2.0 * block @ matrix.T
+        rows[start:start + chunk] = squared.argmin(axis=1)
+    # Recompute the winners directly to avoid cancellation in the expansion
+    distances = np.linalg.norm(probe - matrix[rows], axis=1)
+    return rows, distances
+
+
+def accuracy_check(encodings, tolerance=0.6, noise_levels=(0.03, 0.05, 0.06), queries=2000, seed=0):
+    """Compare match decisions on float64 encodings with each storage dtype
+
+    The reference nearest neighbours are computed in float64 with numpy; each
+    dtype is decoded and matched with GalleryMatcher, as a station would.
+    Queries are gallery rows plus Gaussian noise; the larger noise levels put
+    many queries near the tolerance, where rounding could flip a decision.
+    """
+    from face_matcher import GalleryMatcher
+
+    matrix = np.asarray(encodings, dtype=np.float64)
+    ids = [str(i) for i in range(len(matrix))]
+    rng = np.random.default_rng(seed)
+
+    report = {}
+    for dtype in DTYPE_CODES:
+        decoded = np.vstack([decode_embedding(encode_embedding(row, dtype)) for row in matrix])
+        candidate = GalleryMatcher(decoded, ids, ids, tolerance)
+        total = agree = 0
+        max_error = 0.0
+        for noise in noise_levels:
+            picks = rng.integers(0, len(matrix), queries)
+            probe = matrix[picks] + rng.normal(0.0, noise, (queries, matrix.shape[1]))
+            ref_rows, ref_distances = nearest_float64(matrix, probe)
+            for row, distance, got in zip(ref_rows, ref_distances, candidate.match(probe, k=1)):
+                total += 1
+                agree += (bool(distance <= tolerance) == got.is_match
+                          and [ids[row]] == got.student_ids[:1])
+                max_error = max(max_error, abs(float(distance) - float(got.distances[0])))
+        report[dtype] = {
+            "bytes": len(encode_embedding(matrix[0], dtype)),
+            "agreement": agree / total,
+            "max_distance_error": max_error,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact face encoding storage: migration and accuracy check")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Rewrite stored encodings in the compact format")
+    parser.add_argument("--dtype", default=DEFAULT_DTYPE, choices=list(DTYPE_CODES))
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare match decisions at --tolerance for every dtype")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="Run --check on N synthetic encodings instead of the database")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    args = parser.parse_args()
+
+    if args.check:
+        if args.synthetic:
+            from face_index import synthetic_gallery
+            encodings = synthetic_gallery(args.synthetic).astype(np.float64)
+        else:
+            from data_access import connect
+            from face_matcher import load_gallery
+            conn = connect()
+            try:
+                encodings, _, _ = load_gallery(conn.cursor())
+            finally:
+                conn.close()
+        if not len(encodings):
+            print("No face data loaded. Register students first.")
+            return
+        legacy = np.asarray(encodings[0], dtype=np.float64).nbytes
+        print(f"{len(encodings)} encodings, tolerance {args.tolerance}; raw float64 is {legacy} bytes")
+        for dtype, r in accuracy_check(encodings, args.tolerance).items():
+            print(f"{dtype:<8} {r['bytes']:>4} bytes ({legacy / r['bytes']:.1f}x smaller)  "
+                  f"decisions unchanged {r['agreement']:.2%}  "
+                  f"max distance error {r['max_distance_error']:.5f}")
+
+    if args.migrate:
+        from data_access import connect
+        conn = connect()
+        try:
+            rewritten, before, after = migrate(conn, args.dtype, args.batch_size)
+        finally:
+            conn.close()
+        print(f"Rewrote {rewritten} encodings as {args.dtype}: {before} -> {after} bytes")
+
+
+if __name__ == "__main__":
+    main()
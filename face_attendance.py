@@ -1,14 +1,31 @@
+import argparse
+import queue
+import socket
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 import cv2
-import face_recognition
-import numpy as np
-import mysql.connector
+from data_access import Error, connect
 from datetime import datetime
-from PIL import Image, ImageTk
+from face_matcher import GalleryMatcher
+from gallery_snapshot import gallery_marker, load_gallery_cached
+from gallery_reload import GalleryReloader
+from face_index import make_index
+from face_recognizer import FaceRecognizer
+from face_detectors import make_detector
+from video_preview import PreviewRenderer
+from station_metrics import MetricsExporter, StationMetrics, summary_lines
+from face_tracker import TrackingRecognizer
+from adaptive_detection import AdaptiveRecognizer
+from motion_gate import MotionGate
+from attendance_pipeline import LatestFrameGrabber, RecognitionPipeline
+from attendance_writer import AttendanceWriter
 
 class FaceAttendanceSystem:
-    def __init__(self, root):
+    def __init__(self, root, index_type="exact", workers=2, drop_stale=True,
+                 tracking=False, detect_every=5, adaptive=False, entry_zones=(),
+                 motion_gate=True, detector="hog", display_fps=30,
+                 metrics_panel=False, metrics_port=None, metrics_file=None):
         self.root = root
         self.root.title("Face Recognition Attendance System")
         self.root.geometry("1000x700")
@@ -16,10 +33,42 @@ class FaceAttendanceSystem:
         # Database connection
         self.db_connect()
         
+        # Runtime metrics: optional panel, Prometheus endpoint and/or file
+        self.metrics = StationMetrics({"station": socket.gethostname()})
+        self.metrics_panel = metrics_panel
+        self.last_metrics_update = 0.0
+        self.exporter = None
+        if metrics_port or metrics_file:
+            self.exporter = MetricsExporter(lambda: [self.metrics.snapshot()],
+                                            port=metrics_port, path=metrics_file)
+            self.exporter.start()
+        
+        # Attendance is written in batches on a background thread
+        self.writer = AttendanceWriter(connect,
+                                       metrics=self.metrics)
+        self.writer.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Face recognition variables
         self.known_face_encodings = []
         self.known_student_ids = []
         self.known_student_names = []
+        self.index_type = index_type  # "exact" or "ivf" for very large galleries
+        self.gallery_marker = (0, None)
+        self.matcher = GalleryMatcher([], [], [])
+        # Detector backend is chosen per station: hog, haar, lbp, haar+hog or lbp+hog
+        self.recognizer = FaceRecognizer(self.matcher, detector=make_detector(detector),
+                                         metrics=self.metrics)
+        
+        # Adaptive mode: search near recent faces and entry zones at a fitted scale
+        self.adaptive = AdaptiveRecognizer(self.recognizer, entry_zones) if adaptive else None
+        
+        # Tracking mode: full detection every N frames, tracked boxes in between
+        locator = self.adaptive or self.recognizer
+        self.tracker = TrackingRecognizer(locator, detect_every) if tracking else None
+        
+        # Skip detection entirely while nothing moves in front of the camera
+        self.motion_gate = MotionGate() if motion_gate else None
         self.today_attendance = set()
         
         # Video capture
@@ -27,11 +76,29 @@ class FaceAttendanceSystem:
         self.current_frame = None
         self.is_running = False
         
+        # Background recognition pipeline
+        self.pipeline = None
+        self.workers = workers
+        self.drop_stale = drop_stale  # Skip frames that waited too long
+        self.last_painted_seq = 0
+        self.reported_errors = 0  # Recognition errors already shown in the status bar
+        self.display_fps = display_fps  # Preview rate, independent of recognition
+        
         # Load known faces
         self.load_known_faces()
         
+        # Pick up enrolments, recaptures and deletions while running
+        self.reloader = GalleryReloader(
+            connect,
+            lambda: self.matcher,
+            self.set_matcher,
+            self.gallery_marker
+        )
+        self.reloader.start()
+        
         # Setup GUI
         self.setup_ui()
+        self.preview = PreviewRenderer(self.video_label, self.display_fps)
         
         # Load initial data
         self.load_attendance_data()
@@ -39,14 +106,9 @@ class FaceAttendanceSystem:
     def db_connect(self):
         """Connect to MySQL database with error handling"""
         try:
-            self.db = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="harsh@2002",
-                database="attendance_system"
-            )
+            self.db = connect()
             self.cursor = self.db.cursor()
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", 
                                f"Could not connect to database:\n{err}")
             self.root.destroy()
@@ -54,16 +116,32 @@ class FaceAttendanceSystem:
     def load_known_faces(self):
         """Load face encodings and student info from database"""
         try:
-            self.cursor.execute("SELECT student_id, name, face_encoding FROM students")
-            for student_id, name, encoding_bytes in self.cursor.fetchall():
-                encoding = np.frombuffer(encoding_bytes, dtype=np.float64)
-                self.known_face_encodings.append(encoding)
-                self.known_student_ids.append(student_id)
-                self.known_student_names.append(name)
-        except mysql.connector.Error as err:
+            # Taken first so the reloader cannot miss changes made while loading
+            self.gallery_marker = gallery_marker(self.cursor)
+            
+            # Memory-mapped from the on-disk snapshot unless the database has changed
+            (self.known_face_encodings,
+             self.known_student_ids,
+             self.known_student_names) = load_gallery_cached(self.cursor, marker=self.gallery_marker)
+            
+            # Pack the gallery into a single matrix for batched matching
+            self.matcher = GalleryMatcher(
+                self.known_face_encodings,
+                self.known_student_ids,
+                self.known_student_names,
+                tolerance=0.6,  # Adjust for strictness
+                index=make_index(self.index_type)
+            )
+            self.recognizer.matcher = self.matcher
+        except Error as err:
             messagebox.showerror("Database Error", 
                                f"Error loading face data:\n{err}")
     
+    def set_matcher(self, matcher):
+        """Swap in an updated gallery; called from the reloader thread"""
+        self.matcher = matcher
+        self.recognizer.matcher = matcher
+    
     def setup_ui(self):
         """Create the user interface"""
         # Configure grid layout
@@ -109,6 +187,18 @@ class FaceAttendanceSystem:
                                 state=tk.DISABLED)
         self.stop_btn.pack(side="left", padx=5)
         
+        # Frame counters while running
+        self.stats_var = tk.StringVar()
+        tk.Label(control_frame, textvariable=self.stats_var, bg="white",
+                 fg="gray", font=("Arial", 9)).pack(side="right", padx=5)
+        
+        # Optional stats panel with rates and stage latencies
+        self.metrics_var = tk.StringVar()
+        if self.metrics_panel:
+            tk.Label(video_frame, textvariable=self.metrics_var, bg="white", fg="#333333",
+                     font=("Courier", 9), justify="left", anchor="w"
+                     ).grid(row=2, column=0, sticky="ew", padx=5, pady=(0, 5))
+        
         # Attendance log
         log_frame = tk.Frame(main_frame, bg="white", bd=2, relief=tk.GROOVE)
         log_frame.grid(row=2, column=0, sticky="ew", pady=(10, 0))
@@ -170,13 +260,13 @@ class FaceAttendanceSystem:
             # Update status
             self.status_var.set(f"Showing attendance for {date}")
             
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", 
                                f"Error loading attendance data:\n{err}")
     
     def start_attendance(self):
         """Start the attendance system"""
-        if not self.known_face_encodings:
+        if not len(self.matcher):
             messagebox.showerror("Error", "No face data loaded. Register students first.")
             return
             
@@ -194,7 +284,7 @@ class FaceAttendanceSystem:
                 (today,)
             )
             self.today_attendance = {row[0] for row in self.cursor.fetchall()}
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", 
                                f"Error loading today's attendance:\n{err}")
             return
@@ -204,106 +294,197 @@ class FaceAttendanceSystem:
         self.stop_btn.config(state=tk.NORMAL)
         self.status_var.set("Attendance system running - Detecting faces...")
         
-        # Start processing frames
+        # Start capture and recognition threads
+        stateful = self.tracker or self.adaptive
+        if stateful:
+            # Tracks and face history depend on frame order, so a single worker runs them
+            for mode in (self.tracker, self.adaptive):
+                if mode:
+                    mode.reset()
+            recognize, workers = stateful.recognize, 1
+        else:
+            recognize, workers = self.recognizer.recognize, self.workers
+        self.pipeline = RecognitionPipeline(
+            LatestFrameGrabber(self.video_capture),
+            recognize,
+            workers=workers,
+            drop_stale=self.drop_stale,
+            gate=self.motion_gate,
+            metrics=self.metrics
+        )
+        if self.motion_gate:
+            self.motion_gate.reset()
+        self.pipeline.start()
+        self.last_painted_seq = 0
+        self.reported_errors = 0
+        
+        # Start painting frames
         self.is_running = True
         self.process_frame()
     
     def stop_attendance(self):
         """Stop the attendance system"""
         self.is_running = False
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
         if self.video_capture:
             self.video_capture.release()
             self.video_capture = None
         
         # Clear video display
-        self.video_label.config(image='')
+        self.preview.clear()
         
         # Update UI
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.status_var.set("Attendance system stopped")
         
-        # Refresh attendance data
+        # Refresh attendance data once buffered events are in the database
+        self.writer.flush()
+        self.report_written()
         self.load_attendance_data()
     
+    def on_close(self):
+        """Stop capture and flush pending attendance before closing the window"""
+        if self.is_running:
+            self.stop_attendance()
+        self.reloader.stop()
+        self.writer.stop()
+        if self.exporter:
+            self.exporter.stop()
+        self.root.destroy()
+    
     def process_frame(self):
-        """Process each video frame for face recognition"""
-        if not self.is_running or not self.video_capture:
+        """Paint the latest recognized frame and record new attendance"""
+        if not self.is_running or not self.pipeline:
             return
             
-        # Capture frame
-        ret, frame = self.video_capture.read()
-        if not ret:
+        if self.pipeline.grabber.failed:
             self.status_var.set("Error reading frame from camera")
             return
         
-        # Convert to RGB and resize for faster processing
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        small_frame = cv2.resize(rgb_frame, (0, 0), fx=0.25, fy=0.25)
-        
-        # Find all faces in the frame
-        face_locations = face_recognition.face_locations(small_frame)
-        face_encodings = face_recognition.face_encodings(small_frame, face_locations)
-        
-        # Process each face
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings, 
-                face_encoding,
-                tolerance=0.6  # Adjust for strictness
-            )
-            
-            # Get the best match
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings, 
-                face_encoding
-            )
-            best_match_index = np.argmin(face_distances)
-            
-            if matches[best_match_index]:
-                student_id = self.known_student_ids[best_match_index]
-                name = self.known_student_names[best_match_index]
-                
-                # Scale up face locations
-                top *= 4; right *= 4; bottom *= 4; left *= 4
-                
-                # Draw rectangle and label
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
-                cv2.putText(frame, f"{name} ({student_id})", 
-                           (left + 6, bottom - 6), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, 
-                           (255, 255, 255), 1)
+        if self.pipeline.errors != self.reported_errors:
+            self.reported_errors = self.pipeline.errors
+            self.status_var.set(f"Error recognizing frame: {self.pipeline.last_error}")
+        
+        # Mark attendance for every student recognized since the last call
+        while True:
+            try:
+                detections = self.pipeline.events.get_nowait()
+            except queue.Empty:
+                break
+            for detection in detections:
+                if not detection.match.is_match:
+                    continue
+                student_id = detection.match.student_ids[0]
+                name = detection.match.names[0]
                 
                 # Mark attendance if not already marked today
                 if student_id not in self.today_attendance:
                     self.mark_attendance(student_id, name)
                     self.today_attendance.add(student_id)
         
-        # Convert to PhotoImage and display
-        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_label.imgtk = imgtk
-        self.video_label.config(image=imgtk)
+        self.report_written()
+        
+        # Paint the newest camera frame with the most recent recognition results,
+        # so the preview stays smooth even when recognition runs slower
+        seq, captured_at, frame = self.pipeline.grabber.latest()
+        if frame is not None and seq != self.last_painted_seq:
+            self.last_painted_seq = seq
+            result = self.pipeline.latest()
+            detections = ()
+            if result and captured_at - result.captured_at < self.pipeline.max_age:
+                detections = result.detections
+            self.preview.render(frame, detections)
+        
+        self.update_stats()
         
-        # Schedule next frame processing
-        self.video_label.after(10, self.process_frame)
+        # Schedule next paint at the display rate
+        self.video_label.after(self.preview.interval, self.process_frame)
+    
+    def update_stats(self):
+        """Show how many frames were recognized, dropped and skipped by the motion gate"""
+        text = f"Processed: {self.pipeline.processed}  Dropped: {self.pipeline.dropped}"
+        if self.pipeline.errors:
+            text += f"  Errors: {self.pipeline.errors}"
+        if self.motion_gate:
+            text += f"  Idle (skipped): {self.motion_gate.skipped}"
+        self.stats_var.set(text)
+        
+        # The panel is refreshed once a second rather than on every paint
+        now = time.monotonic()
+        if self.metrics_panel and now - self.last_metrics_update >= 1.0:
+            self.last_metrics_update = now
+            self.metrics_var.set("\n".join(summary_lines(self.metrics.snapshot())))
     
     def mark_attendance(self, student_id, name):
-        """Record attendance in the database"""
-        try:
-            now = datetime.now()
-            self.cursor.execute(
-                "INSERT INTO attendance (student_id, date, time) VALUES (%s, %s, %s)",
-                (student_id, now.date(), now.time())
-            )
-            self.db.commit()
-            self.status_var.set(f"Attendance marked for {name} ({student_id}) at {now.time()}")
-        except mysql.connector.Error as err:
+        """Queue attendance for the background writer"""
+        self.writer.submit(student_id, name, datetime.now())
+    
+    def report_written(self):
+        """Show attendance the writer has committed or given up on"""
+        while True:
+            try:
+                student_id, name, when = self.writer.written.get_nowait()
+            except queue.Empty:
+                break
+            self.status_var.set(f"Attendance marked for {name} ({student_id}) at {when.time()}")
+        while True:
+            try:
+                batch, err = self.writer.failed.get_nowait()
+            except queue.Empty:
+                break
+            for student_id, _, _ in batch:
+                # Allow the student to be recognized and submitted again
+                self.today_attendance.discard(student_id)
             self.status_var.set(f"Error marking attendance: {err}")
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Face recognition attendance station")
+    parser.add_argument("--index", dest="index_type", default="exact", choices=["exact", "ivf"],
+                        help="Gallery index type")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Recognition worker threads")
+    parser.add_argument("--detector", default="hog",
+                        help="Face detector backend (hog, haar, lbp, haar+hog, lbp+hog)")
+    parser.add_argument("--tracking", action="store_true",
+                        help="Detect every N frames and track faces in between")
+    parser.add_argument("--detect-every", type=int, default=5)
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Search around recent faces and entry zones at an adaptive scale")
+    parser.add_argument("--entry-zone", action="append", default=[], metavar="X0,Y0,X1,Y1",
+                        help="Entry zone as fractions of the frame; may be repeated")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false",
+                        help="Run detection on every frame, even when nothing moves")
+    parser.add_argument("--display-fps", type=int, default=30,
+                        help="Preview repaints per second")
+    parser.add_argument("--metrics-panel", action="store_true",
+                        help="Show runtime metrics under the video")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file",
+                        help="Write Prometheus metrics to this file every few seconds")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = FaceAttendanceSystem(root)
-    root.mainloop()
\ No newline at end of file
+    FaceAttendanceSystem(
+        root,
+        index_type=args.index_type,
+        workers=args.workers,
+        tracking=args.tracking,
+        detect_every=args.detect_every,
+        adaptive=args.adaptive,
+        entry_zones=[tuple(float(v) for v in zone.split(",")) for zone in args.entry_zone],
+        motion_gate=args.motion_gate,
+        detector=args.detector,
+        display_fps=args.display_fps,
+        metrics_panel=args.metrics_panel,
+        metrics_port=args.metrics_port,
+        metrics_file=args.metrics_file,
+    )
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
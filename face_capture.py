@@ -0,0 +1,147 @@
+import threading
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from face_detectors import HogDetector
+
+
+def sharpness(gray_face):
+    """Variance of the Laplacian of a face crop normalised to 96x96; low means blurred"""
+    face = cv2.resize(gray_face, (96, 96), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(face, cv2.CV_64F).var())
+
+
+def face_thumbnail(gray_face):
+    """Tiny contrast-normalised crop for comparing consecutive samples"""
+    thumb = cv2.resize(gray_face, (24, 24), interpolation=cv2.INTER_AREA)
+    return cv2.equalizeHist(thumb).astype(np.float32)
+
+
+class FaceCaptureWorker:
+    """Collect enrolment samples from a camera on a background thread
+
+    Faces are detected on frames downscaled by scale. A sample is only
+    encoded, at full resolution, when the frame holds exactly one face that
+    is at least min_face pixels tall, sharper than min_sharpness and
+    different enough from the last accepted sample (at least min_interval
+    seconds later and min_change grey levels apart on a thumbnail).
+    Everything else is rejected before the encoder runs.
+    """
+
+    def __init__(self, capture, detector=None, samples=5, scale=0.5, min_face=80,
+                 min_sharpness=60.0, min_change=8.0, min_interval=0.3):
+        self.capture = capture
+        self.detector = detector or HogDetector()
+        self.samples = samples
+        self.scale = scale
+        self.min_face = min_face
+        self.min_sharpness = min_sharpness
+        self.min_change = min_change
+        self.min_interval = min_interval
+
+        # (frame, encoding) for every accepted sample
+        self.accepted = []
+        self.rejected = {"no face": 0, "several faces": 0, "too small": 0,
+                         "blurry": 0, "redundant": 0}
+        self.frames = 0
+        self.encoder_calls = 0
+        self.error = None
+
+        self.preview = None  # (seq, annotated frame)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.done = threading.Event()
+        self.thread = None
+
+        self.last_thumb = None
+        self.last_accepted_at = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="face-capture", daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def latest(self):
+        with self.lock:
+            return self.preview
+
+    def status(self):
+        with self.lock:
+            count = len(self.accepted)
+            rejected = ", ".join(f"{reason} {n}" for reason, n in self.rejected.items() if n)
+        text = f"Sample {count}/{self.samples}"
+        return f"{text} - rejected: {rejected}" if rejected else text
+
+    def _run(self):
+        try:
+            seq = 0
+            while not self.stop_event.is_set() and len(self.accepted) < self.samples:
+                ret, frame = self.capture.read()
+                if not ret:
+                    self.error = "Could not read from the camera"
+                    break
+                seq += 1
+                self.frames += 1
+                box, reason = self.check(frame)
+                preview = frame.copy()
+                if box:
+                    top, right, bottom, left = box
+                    color = (0, 255, 0) if reason is None else (0, 165, 255)
+                    cv2.rectangle(preview, (left, top), (right, bottom), color, 2)
+                    if reason:
+                        cv2.putText(preview, reason, (left, max(top - 10, 20)),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                with self.lock:
+                    self.preview = (seq, preview)
+        except Exception as err:
+            self.error = str(err)
+        finally:
+            self.capture.release()
+            self.done.set()
+
+    def check(self, frame):
+        """Accept or reject one frame; returns (full-frame box or None, reject reason or None)"""
+        small = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+        locations = self.detector.detect(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        if not locations:
+            return self._reject(None, "no face")
+
+        box = tuple(int(v / self.scale) for v in locations[0])
+        if len(locations) > 1:
+            return self._reject(box, "several faces")
+        top, right, bottom, left = box
+        if bottom - top < self.min_face:
+            return self._reject(box, "too small")
+
+        height, width = frame.shape[:2]
+        gray = cv2.cvtColor(frame[max(0, top):min(height, bottom), max(0, left):min(width, right)],
+                            cv2.COLOR_BGR2GRAY)
+        if gray.size == 0 or sharpness(gray) < self.min_sharpness:
+            return self._reject(box, "blurry")
+
+        now = time.monotonic()
+        thumb = face_thumbnail(gray)
+        if self.last_thumb is not None and (
+                now - self.last_accepted_at < self.min_interval
+                or float(np.abs(thumb - self.last_thumb).mean()) < self.min_change):
+            return self._reject(box, "redundant")
+
+        # Only samples that passed every cheap check reach the encoder
+        self.encoder_calls += 1
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        encoding = face_recognition.face_encodings(rgb, [box])[0]
+        self.last_thumb = thumb
+        self.last_accepted_at = now
+        with self.lock:
+            self.accepted.append((frame, encoding))
+        return box, None
+
+    def _reject(self, box, reason):
+        with self.lock:
+            self.rejected[reason] += 1
+        return box, reason
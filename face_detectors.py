@@ -0,0 +1,200 @@
+import argparse
+import os
+import threading
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+# File names of the frontal face cascades that ship with OpenCV
+CASCADE_FILES = {
+    "haar": "haarcascade_frontalface_default.xml",
+    "lbp": "lbpcascade_frontalface_improved.xml",
+}
+
+
+def find_cascade(kind):
+    """Locate a bundled cascade file; OpenCV wheels ship haar cascades, source builds also lbp"""
+    name = CASCADE_FILES[kind]
+    base = getattr(getattr(cv2, "data", None), "haarcascades", "")
+    candidates = [
+        os.path.join(base, name),
+        os.path.join(base, "..", "lbpcascades", name),
+        os.path.join(os.path.dirname(__file__), "cascades", name),
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return os.path.normpath(path)
+    raise ValueError(f"Could not find {name}; pass its location with cascade_path")
+
+
+class HogDetector:
+    """dlib HOG detector from face_recognition (the original behaviour)"""
+
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        """Face locations as (top, right, bottom, left) in rgb_image pixels"""
+        return face_recognition.face_locations(rgb_image, self.upsample, model="hog")
+
+
+class CascadeDetector:
+    """OpenCV Haar or LBP cascade: much cheaper than HOG, looser boxes, more false positives"""
+
+    def __init__(self, kind="haar", cascade_path=None, scale_factor=1.1,
+                 min_neighbors=5, min_size=(20, 20)):
+        self.name = kind
+        self.cascade_path = cascade_path or find_cascade(kind)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        # CascadeClassifier is not safe to share between threads
+        self.local = threading.local()
+        if cv2.CascadeClassifier(self.cascade_path).empty():
+            raise ValueError(f"Could not load cascade {self.cascade_path}")
+
+    def classifier(self):
+        if not hasattr(self.local, "classifier"):
+            self.local.classifier = cv2.CascadeClassifier(self.cascade_path)
+        return self.local.classifier
+
+    def detect(self, rgb_image):
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        gray = cv2.equalizeHist(gray)
+        faces = self.classifier().detectMultiScale(
+            gray, scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+
+class CascadeHogDetector:
+    """Cheap cascade proposes faces, HOG confirms them on small crops around each proposal
+
+    Frames where the cascade finds nothing cost only the cascade. Confirmed
+    faces get HOG boxes, which are what the encoder's landmark model expects.
+    """
+
+    def __init__(self, cascade=None, hog=None, padding=0.5):
+        self.cascade = cascade or CascadeDetector("haar", min_neighbors=3)
+        self.hog = hog or HogDetector()
+        self.padding = padding
+        self.name = f"{self.cascade.name}+hog"
+
+    def crops(self, proposals, shape):
+        """Padded (x0, y0, x1, y1) crops around proposals, overlapping ones merged"""
+        height, width = shape[:2]
+        crops = []
+        for top, right, bottom, left in proposals:
+            pad_y = int((bottom - top) * self.padding)
+            pad_x = int((right - left) * self.padding)
+            crop = [max(0, left - pad_x), max(0, top - pad_y),
+                    min(width, right + pad_x), min(height, bottom + pad_y)]
+            # The cascade often fires several times on one face; search it once
+            for other in crops:
+                if crop[0] < other[2] and other[0] < crop[2] and crop[1] < other[3] and other[1] < crop[3]:
+                    other[:] = [min(crop[0], other[0]), min(crop[1], other[1]),
+                                max(crop[2], other[2]), max(crop[3], other[3])]
+                    break
+            else:
+                crops.append(crop)
+        return crops
+
+    def detect(self, rgb_image):
+        faces = []
+        for x0, y0, x1, y1 in self.crops(self.cascade.detect(rgb_image), rgb_image.shape):
+            for top, right, bottom, left in self.hog.detect(rgb_image[y0:y1, x0:x1]):
+                faces.append((top + y0, right + x0, bottom + y0, left + x0))
+        return faces
+
+
+# Backends selectable per station by name
+DETECTORS = {
+    "hog": HogDetector,
+    "haar": lambda **options: CascadeDetector("haar", **options),
+    "lbp": lambda **options: CascadeDetector("lbp", **options),
+    "haar+hog": lambda **options: CascadeHogDetector(CascadeDetector("haar", min_neighbors=3), **options),
+    "lbp+hog": lambda **options: CascadeHogDetector(CascadeDetector("lbp", min_neighbors=3), **options),
+}
+
+
+def make_detector(name="hog", **options):
+    """Create a face detector backend by name"""
+    try:
+        factory = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector: {name} (choose from {', '.join(DETECTORS)})")
+    return factory(**options)
+
+
+def compare_detectors(images, names, reference="hog", scale=0.5):
+    """Per backend: mean and p95 ms per image, faces found, and agreement with the reference"""
+    from face_tracker import box_iou
+
+    results = {}
+    boxes = {}
+    for name in names:
+        try:
+            detector = make_detector(name)
+        except ValueError as err:
+            print(f"Skipping {name}: {err}")
+            continue
+        timings, found = [], []
+        for image in images:
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+            start = time.perf_counter()
+            found.append(detector.detect(small))
+            timings.append((time.perf_counter() - start) * 1000.0)
+        boxes[name] = found
+        results[name] = {
+            "mean_ms": float(np.mean(timings)),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "faces": sum(len(f) for f in found),
+        }
+
+    if reference in boxes:
+        for name in boxes:
+            agreed = ref_total = found_total = 0
+            for ref, got in zip(boxes[reference], boxes[name]):
+                agreed += sum(1 for r in ref if any(box_iou(r, g) >= 0.4 for g in got))
+                ref_total += len(ref)
+                found_total += len(got)
+            # recall: reference faces also found; precision: found faces the reference agrees with
+            results[name]["recall"] = agreed / ref_total if ref_total else 1.0
+            results[name]["precision"] = agreed / found_total if found_total else 1.0
+    return results
+
+
+def main():
+    from face_store import DATASET_PATH, FaceImageStore
+
+    parser = argparse.ArgumentParser(description="Compare face detector backends on stored face images")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Face dataset directory")
+    parser.add_argument("--detectors", default=",".join(DETECTORS),
+                        help="Comma-separated backends to compare")
+    parser.add_argument("--reference", default="hog", help="Backend treated as ground truth")
+    parser.add_argument("--scale", type=float, default=0.5, help="Downscale before detection")
+    args = parser.parse_args()
+
+    images = []
+    for _, path in FaceImageStore(args.dataset).all_images():
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if not images:
+        print("No images found")
+        return
+
+    results = compare_detectors(images, args.detectors.split(","), args.reference, args.scale)
+    print(f"{len(images)} images at scale {args.scale}, agreement measured against {args.reference}")
+    print(f"{'detector':<10} {'mean ms':>8} {'p95 ms':>8} {'faces':>6} {'recall':>7} {'precision':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['mean_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['faces']:>6} "
+              f"{r.get('recall', float('nan')):>7.2f} {r.get('precision', float('nan')):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import time
+
+import numpy as np
+
+
+def squared_distances(queries, vectors, vector_sq_norms=None):
+    """Squared euclidean distances of shape (queries, vectors) in float32"""
+    if vector_sq_norms is None:
+        vector_sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    q_norms = np.einsum("ij,ij->i", queries, queries)
+    sq = q_norms[:, None] + vector_sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    return np.maximum(sq, 0.0, out=sq)
+
+
+def top_k(sq, k):
+    """Row-wise k smallest entries of sq, returned as (indices, distances) sorted ascending"""
+    k = min(k, sq.shape[1])
+    if k < sq.shape[1]:
+        top = np.argpartition(sq, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), sq.shape).copy()
+    top_sq = np.take_along_axis(sq, top, axis=1)
+    order = np.argsort(top_sq, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.sqrt(np.take_along_axis(top_sq, order, axis=1))
+
+
+class ExactIndex:
+    """Brute-force scan over the whole gallery; always returns the true nearest rows"""
+
+    def build(self, matrix):
+        self.matrix = matrix
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return self
+
+    def search(self, queries, k):
+        """Return (row indices, distances), each of shape (queries, k)"""
+        return top_k(squared_distances(queries, self.matrix, self.sq_norms), k)
+
+
+class IVFIndex:
+    """Inverted-file index: k-means cells, only the nprobe closest cells are scanned
+
+    The index keeps the rows of each cell as a range of row_ids into the
+    caller's matrix rather than a reordered copy, so a gallery in shared
+    memory is not duplicated. A layout from get_layout() on the same matrix,
+    e.g. trained once by a parent process, is used by the next build instead
+    of training again.
+    """
+
+    def __init__(self, nlist=None, nprobe=8, train_iterations=10, seed=0, layout=None):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.layout = layout
+
+    def build(self, matrix):
+        if self.layout is not None:
+            # Only valid for the matrix it was trained on; later builds train
+            self.centroids, self.row_ids, self.offsets = self.layout
+            self.layout = None
+            self.centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        else:
+            n = len(matrix)
+            # Roughly sqrt(N) cells keeps both the coarse and the fine scan small
+            nlist = self.nlist or max(1, int(np.sqrt(n)))
+            nlist = max(1, min(nlist, n))
+            self.centroids = self._train(matrix, nlist)
+            self.centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+            assignments = self._assign(matrix)
+
+            # Rows grouped by cell, so a cell is one range of row_ids
+            self.row_ids = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=len(self.centroids))
+            self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.matrix = matrix
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix)[self.row_ids]
+        return self
+
+    def get_layout(self):
+        """(centroids, row_ids, offsets) of the built index, for IVFIndex(layout=...)"""
+        return self.centroids, self.row_ids, self.offsets
+
+    def _train(self, matrix, nlist):
+        """Plain Lloyd k-means on a sample of the gallery"""
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), nlist * 64)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            labels = np.argmin(squared_distances(sample, centroids), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            # Empty cells keep their previous centroid
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids.astype(np.float32)
+
+    def _assign(self, matrix, chunk_size=8192):
+        """Nearest centroid for every row, chunked to bound memory"""
+        labels = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), chunk_size):
+            chunk = matrix[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmin(
+                squared_distances(chunk, self.centroids, self.centroid_sq_norms), axis=1)
+        return labels
+
+    def search(self, queries, k):
+        """Return (row indices, distances); rows are -1 and distances inf when a probe has fewer than k"""
+        nprobe = min(self.nprobe, len(self.centroids))
+        coarse = squared_distances(queries, self.centroids, self.centroid_sq_norms)
+        cells = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for qi, query in enumerate(queries):
+            slices = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells[qi]]
+            candidates = np.concatenate(slices)
+            if len(candidates) == 0:
+                continue
+            rows = self.row_ids[candidates]
+            sq = squared_distances(query[None, :], self.matrix[rows], self.sq_norms[candidates])
+            top, dist = top_k(sq, k)
+            found = top.shape[1]
+            indices[qi, :found] = rows[top[0]]
+            distances[qi, :found] = dist[0]
+        return indices, distances
+
+
+# Name -> factory, so stations can pick an index from configuration
+INDEX_TYPES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def make_index(kind="exact", **options):
+    """Create an index by name ("exact" or "ivf")"""
+    try:
+        return INDEX_TYPES[kind](**options)
+    except KeyError:
+        raise ValueError(f"Unknown index type: {kind}")
+
+
+def synthetic_gallery(size, dim=128, seed=0):
+    """Random encodings with the scale of dlib face encodings"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0.0, 0.09, size=(size, dim)).astype(np.float32)
+
+
+def compare_indexes(matrix, queries, index, k=1, repeats=1):
+    """Recall and per-query latency of index against the exact scan on the same gallery"""
+    exact = ExactIndex().build(matrix)
+    report = {}
+    for name, idx in (("exact", exact), ("candidate", index)):
+        start = time.perf_counter()
+        idx.build(matrix)
+        build_time = time.perf_counter() - start
+
+        latencies = []
+        results = []
+        for _ in range(repeats):
+            for query in queries:
+                start = time.perf_counter()
+                rows, _ = idx.search(query[None, :], k)
+                latencies.append(time.perf_counter() - start)
+                results.append(rows[0])
+        latencies = np.array(latencies) * 1000.0
+        report[name] = {
+            "build_s": build_time,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "rows": np.array(results[:len(queries)]),
+        }
+
+    truth = report["exact"]["rows"]
+    found = report["candidate"]["rows"]
+    recall = np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)])
+    report["recall"] = float(recall)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an approximate face index with the exact scan")
+    parser.add_argument("--size", type=int, default=100000, help="Gallery size")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--k", type=int, default=1, help="Neighbours per query")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default sqrt(size))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF cells scanned per query")
+    parser.add_argument("--noise", type=float, default=0.03,
+                        help="Std-dev of noise added to gallery rows to form queries")
+    args = parser.parse_args()
+
+    matrix = synthetic_gallery(args.size)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed gallery rows, like a new capture of an enrolled student
+    picks = rng.choice(args.size, args.queries, replace=False)
+    queries = (matrix[picks] + rng.normal(0.0, args.noise, (args.queries, matrix.shape[1]))).astype(np.float32)
+
+    index = IVFIndex(nlist=args.nlist, nprobe=args.nprobe)
+    report = compare_indexes(matrix, queries, index, k=args.k)
+
+    print(f"Gallery: {args.size} x {matrix.shape[1]}, queries: {args.queries}, k={args.k}")
+    for name in ("exact", "candidate"):
+        r = report[name]
+        print(f"{name:>9}: build {r['build_s']:.2f}s  p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms")
+    print(f"   recall@{args.k}: {report['recall']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
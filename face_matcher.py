@@ -0,0 +1,177 @@
+import copy
+from collections import namedtuple
+
+import numpy as np
+
+from face_index import ExactIndex
+from embedding_format import decode_embedding
+
+# Result of matching one detected face against the gallery.
+# student_ids/names/distances hold the top-k candidates, best first.
+MatchResult = namedtuple(
+    "MatchResult",
+    ["student_ids", "names", "distances", "margin", "is_match"]
+)
+
+
+def no_match():
+    """MatchResult for a face that has not been (or could not be) identified"""
+    return MatchResult([], [], np.empty(0, dtype=np.float32), np.inf, False)
+
+
+def load_gallery(cursor):
+    """Read (encodings, student_ids, names) for every student with a stored encoding"""
+    cursor.execute(
+        "SELECT student_id, name, face_encoding FROM students "
+        "WHERE face_encoding IS NOT NULL"
+    )
+    encodings, student_ids, names = [], [], []
+    for student_id, name, encoding_bytes in cursor.fetchall():
+        encodings.append(decode_embedding(encoding_bytes))
+        student_ids.append(student_id)
+        names.append(name)
+    return encodings, student_ids, names
+
+
+class GalleryMatcher:
+    """Match every face in a frame against the enrolled gallery in one pass
+
+    The base gallery (matrix and index) is never modified. Students enrolled,
+    recaptured or deleted later are applied with apply_changes, which returns
+    a new matcher sharing the base: changed students live in a small delta
+    that is scanned exactly, and replaced or deleted base rows are masked out.
+    compacted() folds the delta back into a freshly built base.
+    """
+
+    # Fold the delta into the base once it grows past this many rows
+    MAX_DELTA = 256
+
+    def __init__(self, encodings, student_ids, student_names, tolerance=0.6, index=None):
+        self.student_ids = list(student_ids)
+        self.student_names = list(student_names)
+        self.tolerance = tolerance
+
+        # One contiguous float32 matrix instead of a list of float64 arrays.
+        # A float32 matrix passed in (e.g. from shared memory) is used without copying.
+        if isinstance(encodings, np.ndarray) and encodings.ndim == 2:
+            self.matrix = np.ascontiguousarray(encodings, dtype=np.float32)
+        elif len(encodings):
+            self.matrix = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+        else:
+            self.matrix = np.empty((0, 128), dtype=np.float32)
+
+        # Exact scan unless an approximate index is plugged in
+        self.index_template = index or ExactIndex()
+        self.index = copy.copy(self.index_template).build(self.matrix) if len(self.matrix) else None
+
+        # Incremental changes on top of the base
+        self.removed = np.zeros(len(self.matrix), dtype=bool)
+        self.removed_count = 0
+        self.delta = {}  # student_id -> (name, float32 encoding)
+        self.delta_matcher = None
+        self.base_rows = {student_id: row for row, student_id in enumerate(self.student_ids)}
+
+    def __len__(self):
+        return len(self.matrix) - self.removed_count + len(self.delta)
+
+    def apply_changes(self, upserts, removed_ids=()):
+        """Return a new matcher with [(student_id, name, encoding)] upserted and removed_ids dropped"""
+        changed = copy.copy(self)
+        changed.removed = self.removed.copy()
+        changed.delta = dict(self.delta)
+
+        for student_id, name, encoding in upserts:
+            changed._drop_base_row(student_id)
+            changed.delta[student_id] = (name, np.asarray(encoding, dtype=np.float32))
+        for student_id in removed_ids:
+            changed._drop_base_row(student_id)
+            changed.delta.pop(student_id, None)
+
+        changed.removed_count = int(changed.removed.sum())
+        changed.delta_matcher = None
+        if changed.delta:
+            ids = list(changed.delta)
+            changed.delta_matcher = GalleryMatcher(
+                [changed.delta[i][1] for i in ids], ids, [changed.delta[i][0] for i in ids],
+                tolerance=self.tolerance
+            )
+        return changed
+
+    def _drop_base_row(self, student_id):
+        row = self.base_rows.get(student_id)
+        if row is not None:
+            self.removed[row] = True
+
+    def live_ids(self):
+        """Ids of every student currently in the gallery"""
+        base = [i for row, i in enumerate(self.student_ids) if not self.removed[row]]
+        return [i for i in base if i not in self.delta] + list(self.delta)
+
+    def live_students(self):
+        """(matrix, student_ids, names) of every student currently in the gallery"""
+        keep = ~self.removed
+        keep[[self.base_rows[i] for i in self.delta if i in self.base_rows]] = False
+        rows = np.flatnonzero(keep)
+        delta_ids = list(self.delta)
+        matrix = np.vstack([self.matrix[rows]] + [self.delta[i][1][None, :] for i in delta_ids])
+        student_ids = [self.student_ids[r] for r in rows] + delta_ids
+        names = [self.student_names[r] for r in rows] + [self.delta[i][0] for i in delta_ids]
+        return matrix, student_ids, names
+
+    def needs_compaction(self):
+        return len(self.delta) > self.MAX_DELTA or self.removed_count > self.MAX_DELTA
+
+    def compacted(self):
+        """A matcher with the delta folded into a freshly built base index"""
+        matrix, student_ids, names = self.live_students()
+        return GalleryMatcher(matrix, student_ids, names, self.tolerance, self.index_template)
+
+    def match(self, face_encodings, k=2):
+        """Return a MatchResult with the top-k candidates for each face encoding"""
+        if len(face_encodings) == 0:
+            return []
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+
+        base = self._search_base(queries, k)
+        if self.delta_matcher is None:
+            return [self._result(candidates) for candidates in base]
+
+        # Merge base and delta candidates, best first
+        delta = self.delta_matcher._search_base(queries, k)
+        return [self._result(sorted(b + d, key=lambda c: c[0])[:k]) for b, d in zip(base, delta)]
+
+    def _search_base(self, queries, k):
+        """Per query, up to k (distance, student_id, name) from the base, skipping removed rows"""
+        if self.index is None:
+            return [[] for _ in queries]
+
+        # Ask for extra rows so masked-out ones can be skipped
+        top, top_dist = self.index.search(queries, k + self.removed_count)
+        results = []
+        for indices, distances in zip(top, top_dist):
+            candidates = []
+            for row, distance in zip(indices, distances):
+                # Approximate indexes pad with -1 when they found fewer rows
+                if row < 0 or self.removed[row]:
+                    continue
+                candidates.append((float(distance), self.student_ids[row], self.student_names[row]))
+                if len(candidates) == k:
+                    break
+            results.append(candidates)
+        return results
+
+    def _result(self, candidates):
+        """Build a MatchResult from (distance, student_id, name) sorted by distance"""
+        if not candidates:
+            return no_match()
+        distances = np.array([c[0] for c in candidates], dtype=np.float32)
+
+        # Gap between best and second-best match; large means unambiguous
+        margin = float(distances[1] - distances[0]) if len(distances) > 1 else np.inf
+        return MatchResult(
+            [c[1] for c in candidates],
+            [c[2] for c in candidates],
+            distances,
+            margin,
+            bool(distances[0] <= self.tolerance)
+        )
@@ -0,0 +1,86 @@
+from collections import namedtuple
+from contextlib import nullcontext
+
+import cv2
+import face_recognition
+
+from face_detectors import HogDetector
+
+# One recognized or unknown face; box is (top, right, bottom, left) in full-frame pixels.
+# track_id is set when the face comes from a TrackingRecognizer.
+Detection = namedtuple("Detection", ["box", "match", "track_id"], defaults=[None])
+
+
+class FaceRecognizer:
+    """Detect, encode and match faces in BGR frames without any GUI dependency"""
+
+    def __init__(self, matcher, scale=0.25, detector=None, metrics=None):
+        self.matcher = matcher
+        self.scale = scale
+        self.detector = detector or HogDetector()
+        self.metrics = metrics  # StationMetrics receiving per-stage latencies
+
+    def timed(self, stage):
+        return self.metrics.timed(stage) if self.metrics else nullcontext()
+
+    def prepare(self, frame):
+        """Convert a BGR frame to the downscaled RGB image used for detection"""
+        # Downscale first so only the small image is converted
+        small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+    def detect(self, small_frame):
+        """Face locations in small_frame coordinates"""
+        with self.timed("detect"):
+            return self.detector.detect(small_frame)
+
+    def identify(self, small_frame, face_locations):
+        """Encode the given faces and match them against the gallery in one pass"""
+        if not face_locations:
+            return []
+        with self.timed("encode"):
+            face_encodings = face_recognition.face_encodings(small_frame, face_locations)
+        with self.timed("match"):
+            return self.matcher.match(face_encodings)
+
+    def to_frame(self, location):
+        """Scale a small_frame location back up to the captured frame"""
+        factor = 1.0 / self.scale
+        return tuple(int(round(v * factor)) for v in location)
+
+    def locate(self, frame):
+        """Find faces in a BGR frame
+
+        Returns (image, locations, boxes): the RGB image to encode from, face
+        locations in that image, and the same faces in full-frame pixels.
+        """
+        small_frame = self.prepare(frame)
+        face_locations = self.detect(small_frame)
+        return small_frame, face_locations, [self.to_frame(l) for l in face_locations]
+
+    def recognize(self, frame):
+        """Return a Detection for every face found in a BGR frame"""
+        image, face_locations, boxes = self.locate(frame)
+        matches = self.identify(image, face_locations)
+        return [Detection(box, match) for box, match in zip(boxes, matches)]
+
+
+def draw_detections(frame, detections, scale=1.0):
+    """Draw a box and label on frame for every recognized student
+
+    scale maps detection boxes onto frame when it is a resized copy.
+    """
+    for detection in detections:
+        if not detection.match.is_match:
+            continue
+        top, right, bottom, left = (int(v * scale) for v in detection.box)
+        student_id = detection.match.student_ids[0]
+        name = detection.match.names[0]
+
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
+        cv2.putText(frame, f"{name} ({student_id})",
+                    (left + 6, bottom - 6),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                    (255, 255, 255), 1)
+    return frame
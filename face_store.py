@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from urllib.parse import quote
+
+import cv2
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "face_dataset")
+MANIFEST_NAME = "manifest.jsonl"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class FaceImageStore:
+    """Face images in per-student directories spread over hashed shard directories
+
+    Layout: <root>/<shard>/<student>/<n>.jpg, where shard is the first two hex
+    digits of the md5 of the student id. An append-only manifest records every
+    add and delete, so looking up or deleting a student's images never lists
+    the whole dataset. Images still in the old flat layout ({student_id}_{n}.jpg
+    directly in root) are indexed at startup and served until migrate_flat()
+    moves them.
+    """
+
+    def __init__(self, root=DATASET_PATH):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.lock = threading.Lock()
+
+        # student_id -> {file name: path relative to root}
+        self.index = {}
+        self.journal_entries = 0
+        self._load_manifest()
+        self._index_flat()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.journal_entries += 1
+                student_id = entry["student_id"]
+                if entry["op"] == "add":
+                    path = entry["path"]
+                    self.index.setdefault(student_id, {})[path.rpartition("/")[2]] = path
+                elif entry["op"] == "delete":
+                    self.index.pop(student_id, None)
+
+    def _index_flat(self):
+        """Index images left in the legacy flat layout"""
+        self.flat = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                name = entry.name
+                if not entry.is_file() or not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                student_id, sep, _ = name.rpartition("_")
+                if sep:
+                    self.flat.setdefault(student_id, []).append(name)
+
+    def _append(self, entries):
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        self.journal_entries += len(entries)
+
+    def student_dir(self, student_id):
+        """Relative directory for a student's images ('/'-separated on every platform)"""
+        shard = hashlib.md5(student_id.encode("utf-8")).hexdigest()[:2]
+        return f"{shard}/{quote(student_id, safe='')}"
+
+    def save_image(self, student_id, number, frame):
+        """Write sample number for a student, replacing any previous one; returns the path"""
+        relative = f"{self.student_dir(student_id)}/{number}.jpg"
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, frame)
+        with self.lock:
+            files = self.index.setdefault(student_id, {})
+            if files.get(f"{number}.jpg") != relative:
+                files[f"{number}.jpg"] = relative
+                self._append([{"op": "add", "student_id": student_id, "path": relative}])
+        return path
+
+    def images(self, student_id):
+        """Absolute paths of a student's images, sorted by name"""
+        with self.lock:
+            paths = [os.path.join(self.root, p) for p in self.index.get(student_id, {}).values()]
+            paths += [os.path.join(self.root, n) for n in self.flat.get(student_id, [])]
+        return sorted(paths)
+
+    def all_images(self):
+        """Yield (student_id, path) for every stored image"""
+        with self.lock:
+            students = sorted(set(self.index) | set(self.flat))
+        for student_id in students:
+            for path in self.images(student_id):
+                yield student_id, path
+
+    def delete_student(self, student_id):
+        """Delete every image of a student"""
+        with self.lock:
+            self.index.pop(student_id, None)
+            flat = self.flat.pop(student_id, [])
+            self._append([{"op": "delete", "student_id": student_id}])
+        shutil.rmtree(os.path.join(self.root, self.student_dir(student_id)), ignore_errors=True)
+        for name in flat:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+
+    def compact(self):
+        """Rewrite the manifest with one line per live image"""
+        with self.lock:
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for student_id, files in self.index.items():
+                    for relative in files.values():
+                        f.write(json.dumps({"op": "add", "student_id": student_id,
+                                            "path": relative}) + "\n")
+            os.replace(tmp_path, self.manifest_path)
+            self.journal_entries = sum(len(files) for files in self.index.values())
+
+    def migrate_flat(self):
+        """Move every legacy {student_id}_{n}.jpg into the sharded layout; returns the count"""
+        moved = 0
+        with self.lock:
+            flat, self.flat = self.flat, {}
+        for student_id, names in flat.items():
+            entries = []
+            for name in names:
+                relative = f"{self.student_dir(student_id)}/{name.rpartition('_')[2]}"
+                os.makedirs(os.path.join(self.root, os.path.dirname(relative)), exist_ok=True)
+                os.replace(os.path.join(self.root, name), os.path.join(self.root, relative))
+                entries.append({"op": "add", "student_id": student_id, "path": relative})
+                with self.lock:
+                    self.index.setdefault(student_id, {})[relative.rpartition("/")[2]] = relative
+                moved += 1
+            with self.lock:
+                self._append(entries)
+        self.compact()
+        return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the sharded face image store")
+    parser.add_argument("--root", default=DATASET_PATH, help="Face dataset directory")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Move flat {student_id}_{n}.jpg files into the sharded layout")
+    parser.add_argument("--compact", action="store_true", help="Rewrite the manifest")
+    args = parser.parse_args()
+
+    store = FaceImageStore(args.root)
+    if args.migrate:
+        print(f"Migrated {store.migrate_flat()} images")
+    elif args.compact:
+        store.compact()
+        print("Manifest compacted")
+    else:
+        students = {student_id for student_id, _ in store.all_images()}
+        print(f"{len(students)} students, {sum(1 for _ in store.all_images())} images, "
+              f"{sum(len(v) for v in store.flat.values())} still in the flat layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import itertools
+import threading
+
+import cv2
+import numpy as np
+
+from face_matcher import no_match
+from face_recognizer import Detection
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_patch(gray, box, size=16):
+    """Tiny grayscale thumbnail of a box, used to notice when a track drifts"""
+    top, right, bottom, left = box
+    h, w = gray.shape[:2]
+    crop = gray[max(0, top):min(h, bottom), max(0, left):min(w, right)]
+    if crop.size == 0:
+        return None
+    return cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class Track:
+    """A face followed across frames; match stays None until it has been encoded"""
+
+    def __init__(self, track_id, box, patch):
+        self.track_id = track_id
+        self.box = box
+        self.patch = patch
+        self.match = None
+        self.misses = 0
+
+
+class TrackingRecognizer:
+    """Run full detection every N frames and carry tracked faces forward in between
+
+    Boxes are associated across detections by IoU. Between detections a track
+    keeps its last box, and a cheap thumbnail comparison flags tracks whose
+    content has changed, which forces a detection on that frame. Tracks that
+    are already identified are never re-encoded; unknown tracks are encoded
+    again on detection frames.
+
+    Tracking depends on frame order, so calls are serialized with a lock and
+    the recognizer should be driven by a single pipeline worker.
+    """
+
+    def __init__(self, recognizer, detect_every=5, iou_threshold=0.3,
+                 max_misses=2, change_threshold=30.0):
+        self.recognizer = recognizer
+        self.detect_every = detect_every
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.change_threshold = change_threshold
+
+        self.tracks = []
+        self.track_ids = itertools.count(1)
+        self.frame_count = 0
+        self.lock = threading.Lock()
+
+        # How much work the tracker saved
+        self.stats = {"frames": 0, "detections": 0, "encodings": 0}
+
+    def reset(self):
+        with self.lock:
+            self.tracks = []
+            self.frame_count = 0
+
+    def recognize(self, frame):
+        """Return a Detection for every tracked face in a BGR frame"""
+        with self.lock:
+            self.frame_count += 1
+            self.stats["frames"] += 1
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+            due = (self.frame_count - 1) % self.detect_every == 0
+            if due or self._any_track_lost(gray):
+                self._detect(frame, gray)
+
+            return [
+                Detection(track.box, track.match or no_match(), track.track_id)
+                for track in self.tracks if track.misses == 0
+            ]
+
+    def _any_track_lost(self, gray):
+        """True when a tracked face no longer looks like it did at the last detection"""
+        for track in self.tracks:
+            patch = box_patch(gray, track.box)
+            if patch is None or track.patch is None:
+                return True
+            if np.mean(np.abs(patch - track.patch)) > self.change_threshold:
+                return True
+        return False
+
+    def _detect(self, frame, gray):
+        self.stats["detections"] += 1
+        image, locations, boxes = self.recognizer.locate(frame)
+
+        # Greedy IoU association, best overlaps first
+        pairs = sorted(
+            ((box_iou(track.box, box), ti, di)
+             for ti, track in enumerate(self.tracks)
+             for di, box in enumerate(boxes)),
+            reverse=True
+        )
+        matched_tracks, matched_boxes = set(), {}
+        for overlap, ti, di in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes[di] = self.tracks[ti]
+
+        # Age out tracks that were not seen in this detection
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        to_encode = []
+        for di, box in enumerate(boxes):
+            track = matched_boxes.get(di)
+            if track is None:
+                track = Track(next(self.track_ids), box, None)
+                self.tracks.append(track)
+            track.box = box
+            track.patch = box_patch(gray, box)
+            track.misses = 0
+            if track.match is None or not track.match.is_match:
+                to_encode.append((track, locations[di]))
+
+        # Only new or still-unknown faces pay for an encoding
+        if to_encode:
+            self.stats["encodings"] += len(to_encode)
+            matches = self.recognizer.identify(image, [location for _, location in to_encode])
+            for (track, _), match in zip(to_encode, matches):
+                track.match = match
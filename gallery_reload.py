@@ -0,0 +1,109 @@
+import threading
+
+from data_access import Error
+
+from embedding_format import decode_embedding
+from gallery_snapshot import gallery_marker
+
+
+class GalleryReloader:
+    """Poll the students table and apply enrolments, recaptures and deletions live
+
+    Each poll asks the database only for the (count, last updated_at) marker.
+    When it moves, rows with updated_at at or after the last one seen are
+    fetched and upserted; if the gallery size still disagrees with the count,
+    the enrolled ids (without encodings) are compared to find deletions. The
+    new matcher is built on this thread and handed to set_matcher, so
+    recognition keeps running on the old one until the swap.
+    """
+
+    def __init__(self, connect, get_matcher, set_matcher, marker, interval=2.0):
+        self.connect = connect
+        self.get_matcher = get_matcher
+        self.set_matcher = set_matcher
+        self.marker = marker
+        self.interval = interval
+
+        self.conn = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Counters for the status line
+        self.reloads = 0
+        self.errors = 0
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="gallery-reloader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval + 2)
+        self._close_connection()
+
+    def _close_connection(self):
+        if self.conn:
+            try:
+                self.conn.close()
+            except Error:
+                pass
+            self.conn = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                if self.conn is None:
+                    self.conn = self.connect()
+                self.poll()
+            except Error:
+                # Try again with a new connection on the next poll
+                self.errors += 1
+                self._close_connection()
+
+    def poll(self):
+        """Apply any changes since the last poll; returns True if the gallery changed"""
+        cursor = self.conn.cursor()
+        try:
+            # Each poll must see the latest committed rows
+            self.conn.commit()
+            marker = gallery_marker(cursor)
+            if marker == self.marker:
+                return False
+            count, _ = marker
+            since = self.marker[1]
+
+            if since is None:
+                cursor.execute(
+                    "SELECT student_id, name, face_encoding FROM students "
+                    "WHERE face_encoding IS NOT NULL"
+                )
+            else:
+                # >= so rows sharing the last timestamp are not missed; upserts are idempotent
+                cursor.execute(
+                    "SELECT student_id, name, face_encoding FROM students "
+                    "WHERE face_encoding IS NOT NULL AND updated_at >= %s",
+                    (since,)
+                )
+            upserts = [(student_id, name, decode_embedding(blob))
+                       for student_id, name, blob in cursor.fetchall()]
+
+            matcher = self.get_matcher().apply_changes(upserts)
+            removed = []
+            if len(matcher) != count:
+                # Deleted (or renamed) students: compare ids only, never encodings
+                cursor.execute("SELECT student_id FROM students WHERE face_encoding IS NOT NULL")
+                enrolled = {row[0] for row in cursor.fetchall()}
+                removed = [i for i in matcher.live_ids() if i not in enrolled]
+                matcher = matcher.apply_changes([], removed)
+
+            if matcher.needs_compaction():
+                matcher = matcher.compacted()
+        finally:
+            cursor.close()
+
+        self.set_matcher(matcher)
+        self.marker = marker
+        self.reloads += 1
+        return True
@@ -0,0 +1,128 @@
+import json
+import os
+import struct
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from face_matcher import load_gallery
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "gallery.snapshot")
+
+# File layout: MAGIC, u32 header length, JSON header, zero padding,
+# then the float32 encodings matrix aligned to ALIGNMENT bytes.
+MAGIC = b"FGALSNAP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+class SnapshotError(Exception):
+    """The snapshot file is missing, corrupt or written by another format version"""
+
+
+def gallery_marker(cursor):
+    """Cheap (count, last updated_at) fingerprint of the enrolled gallery"""
+    cursor.execute(
+        "SELECT COUNT(*), MAX(updated_at) FROM students WHERE face_encoding IS NOT NULL"
+    )
+    count, updated_at = cursor.fetchone()
+    if isinstance(updated_at, str):
+        # SQLite returns aggregates of timestamp columns as text
+        updated_at = datetime.fromisoformat(updated_at)
+    return count, updated_at
+
+
+def format_marker(marker):
+    count, updated_at = marker
+    return f"{count}:{updated_at.isoformat() if updated_at else ''}"
+
+
+def _checksum(matrix, student_ids, names):
+    crc = zlib.crc32(json.dumps([student_ids, names]).encode("utf-8"))
+    return zlib.crc32(memoryview(np.ascontiguousarray(matrix)).cast("B"), crc)
+
+
+def write_snapshot(path, matrix, student_ids, names, marker):
+    """Write the gallery atomically so a running station never reads half a file"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    header = {
+        "version": FORMAT_VERSION,
+        "marker": marker,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "dtype": "float32",
+        "checksum": _checksum(matrix, student_ids, names),
+        "student_ids": list(student_ids),
+        "names": list(names),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_offset = len(MAGIC) + 4 + len(header_bytes)
+    padding = -data_offset % ALIGNMENT
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * padding)
+        f.write(matrix.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, verify=True):
+    """Memory-map a snapshot; return (matrix, student_ids, names, marker)"""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SnapshotError("Not a gallery snapshot")
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+    except (OSError, ValueError, struct.error) as err:
+        raise SnapshotError(f"Could not read snapshot: {err}")
+
+    if header.get("version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {header.get('version')}")
+
+    data_offset = len(MAGIC) + 4 + header_length
+    data_offset += -data_offset % ALIGNMENT
+    shape = (header["count"], header["dim"])
+    if header["count"] == 0:
+        matrix = np.empty(shape, dtype=np.float32)
+    else:
+        try:
+            matrix = np.memmap(path, dtype=np.float32, mode="r", offset=data_offset, shape=shape)
+        except ValueError as err:
+            raise SnapshotError(f"Truncated snapshot: {err}")
+
+    student_ids, names = header["student_ids"], header["names"]
+    if verify and _checksum(matrix, student_ids, names) != header["checksum"]:
+        raise SnapshotError("Snapshot checksum mismatch")
+    return matrix, student_ids, names, header["marker"]
+
+
+def load_gallery_cached(cursor, path=SNAPSHOT_PATH, marker=None):
+    """Gallery from the snapshot if it is current, otherwise rebuilt from the database
+
+    Returns (matrix, student_ids, names); the matrix is memory-mapped from disk.
+    marker may be passed in when the caller already queried gallery_marker.
+    """
+    marker = format_marker(marker or gallery_marker(cursor))
+    try:
+        matrix, student_ids, names, snapshot_marker = read_snapshot(path)
+        if snapshot_marker == marker:
+            return matrix, student_ids, names
+    except SnapshotError:
+        pass
+
+    # Stale or unusable: pull the encodings once and refresh the snapshot
+    encodings, student_ids, names = load_gallery(cursor)
+    matrix = (np.vstack(encodings).astype(np.float32) if encodings
+              else np.empty((0, 128), dtype=np.float32))
+    try:
+        write_snapshot(path, matrix, student_ids, names, marker)
+        matrix, student_ids, names, _ = read_snapshot(path, verify=False)
+    except (OSError, SnapshotError):
+        # E.g. another station still has the old file mapped; use the fresh copy
+        pass
+    return matrix, student_ids, names
@@ -0,0 +1,77 @@
+import threading
+
+import cv2
+
+
+class MotionGate:
+    """Decide from a tiny grayscale thumbnail whether a frame is worth running detection on
+
+    The thumbnail is compared against a running-average background. A frame
+    counts as active when more than min_changed of its thumbnail pixels
+    differ from the background by more than pixel_threshold levels. After
+    motion stops, frames stay active for hold_frames more frames so a person
+    who has just stopped in front of the camera is still recognized.
+    """
+
+    def __init__(self, size=(64, 48), pixel_threshold=18, min_changed=0.01,
+                 learning_rate=0.2, hold_frames=15):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.hold_frames = hold_frames
+
+        self.background = None
+        self.hold = 0
+        self.lock = threading.Lock()
+
+        # Counters for the status line
+        self.frames = 0
+        self.skipped = 0
+
+    def reset(self):
+        with self.lock:
+            self.background = None
+            self.hold = 0
+
+    def is_active(self, frame):
+        """True if frame should go through face detection"""
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.GaussianBlur(thumb, (3, 3), 0).astype("float32")
+
+        with self.lock:
+            self.frames += 1
+            if self.background is None:
+                self.background = thumb
+                self.hold = self.hold_frames
+                return True
+
+            diff = cv2.absdiff(thumb, self.background)
+            changed = float((diff > self.pixel_threshold).mean())
+            cv2.accumulateWeighted(thumb, self.background, self.learning_rate)
+
+            if changed > self.min_changed:
+                self.hold = self.hold_frames
+                return True
+            if self.hold > 0:
+                self.hold -= 1
+                return True
+            self.skipped += 1
+            return False
+
+
+class MotionGatedRecognizer:
+    """Run the wrapped recognizer only on frames the motion gate lets through"""
+
+    def __init__(self, recognizer, gate=None):
+        self.recognizer = recognizer
+        self.gate = gate or MotionGate()
+
+    def reset(self):
+        self.gate.reset()
+
+    def recognize(self, frame):
+        if not self.gate.is_active(frame):
+            return []
+        return self.recognizer.recognize(frame)
@@ -0,0 +1,196 @@
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import time
+from datetime import datetime, timedelta
+
+import cv2
+from data_access import connect
+
+from face_matcher import GalleryMatcher
+from gallery_snapshot import load_gallery_cached
+from face_index import make_index
+import attendance_rollups
+from attendance_writer import insert_attendance
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def sample_frames(source, every=1, frame_rate=25.0):
+    """Yield (offset_seconds, frame) for every Nth frame of a video file or frame directory"""
+    if os.path.isdir(source):
+        # Frames are taken in name order and spaced 1/frame_rate seconds apart
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index in range(0, len(names), every):
+            frame = cv2.imread(os.path.join(source, names[index]))
+            if frame is not None:
+                yield index / frame_rate, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {source}")
+    try:
+        index = 0
+        while True:
+            # grab() skips decoding the frames we are not going to look at
+            if not capture.grab():
+                break
+            if index % every == 0:
+                ret, frame = capture.retrieve()
+                if not ret:
+                    break
+                yield capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+# Per-process recognizer for the pool workers
+_recognizer = None
+
+
+def _init_worker(encodings, student_ids, names, tolerance, index_type, scale, detector):
+    global _recognizer
+    from face_recognizer import FaceRecognizer
+    from face_detectors import make_detector
+    matcher = GalleryMatcher(encodings, student_ids, names, tolerance, index=make_index(index_type))
+    _recognizer = FaceRecognizer(matcher, scale=scale, detector=make_detector(detector))
+
+
+def _recognize(item):
+    offset, frame = item
+    return offset, _recognizer.recognize(frame)
+
+
+class OfflineAttendance:
+    """Take attendance from recorded footage as fast as the CPU allows"""
+
+    def __init__(self, encodings, student_ids, names, tolerance=0.6, index_type="exact",
+                 scale=0.25, workers=1, detector="hog"):
+        self.worker_args = (encodings, student_ids, names, tolerance, index_type, scale, detector)
+        self.workers = workers
+
+        # student_id -> [name, first_seen, last_seen, sightings]
+        self.seen = {}
+        self.frames = 0
+        self.faces = 0
+
+    def results(self, frames):
+        """Yield (offset, detections) for each sampled frame, in order"""
+        if self.workers <= 1:
+            _init_worker(*self.worker_args)
+            for item in frames:
+                yield _recognize(item)
+            return
+
+        with mp.get_context("spawn").Pool(self.workers, initializer=_init_worker,
+                                          initargs=self.worker_args) as pool:
+            # imap keeps frame order so first/last-seen times stay correct
+            yield from pool.imap(_recognize, frames, chunksize=4)
+
+    def run(self, source, every=1, frame_rate=25.0):
+        started = time.perf_counter()
+        for offset, detections in self.results(sample_frames(source, every, frame_rate)):
+            self.frames += 1
+            self.faces += len(detections)
+            for detection in detections:
+                if not detection.match.is_match:
+                    continue
+                student_id = detection.match.student_ids[0]
+                if student_id not in self.seen:
+                    self.seen[student_id] = [detection.match.names[0], offset, offset, 0]
+                entry = self.seen[student_id]
+                entry[2] = offset
+                entry[3] += 1
+        return time.perf_counter() - started
+
+    def events(self):
+        """Attendance events as (student_id, name, first_seen, last_seen, sightings)"""
+        return sorted(((sid, *entry) for sid, entry in self.seen.items()), key=lambda e: e[2])
+
+
+def record_attendance(events, start):
+    """Insert one attendance row per student, timed at their first sighting"""
+    rows = []
+    for student_id, _, first_seen, _, _ in events:
+        when = start + timedelta(seconds=first_seen)
+        rows.append((student_id, when.date(), when.time()))
+
+    conn = connect()
+    try:
+        rollups = attendance_rollups.available(conn)
+        cursor = conn.cursor()
+        try:
+            # Students already marked that day are skipped by the unique key
+            insert_attendance(cursor, conn.backend, rows, rollups)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+def format_offset(seconds):
+    return str(timedelta(seconds=round(seconds, 2)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Take attendance from a recorded video or frame directory")
+    parser.add_argument("source", help="Video file or directory of frames")
+    parser.add_argument("--every", type=int, default=5, help="Process every Nth frame")
+    parser.add_argument("--frame-rate", type=float, default=25.0,
+                        help="Frame rate used to time frames in a directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Recognition processes")
+    parser.add_argument("--scale", type=float, default=0.25, help="Downscale before detection")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--index", default="exact", choices=["exact", "ivf"])
+    parser.add_argument("--detector", default="hog", help="Face detector backend (hog, haar, lbp, haar+hog, lbp+hog)")
+    parser.add_argument("--output", help="Write attendance events to this CSV file")
+    parser.add_argument("--record", metavar="START",
+                        help="Record attendance in the database; START is when the "
+                             "recording began, as 'YYYY-MM-DD HH:MM:SS'")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.record, "%Y-%m-%d %H:%M:%S") if args.record else None
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        encodings, student_ids, names = load_gallery_cached(cursor)
+    finally:
+        conn.close()
+    if not len(encodings):
+        print("No face data loaded. Register students first.")
+        return
+
+    offline = OfflineAttendance(encodings, student_ids, names, args.tolerance, args.index,
+                                args.scale, args.workers, args.detector)
+    elapsed = offline.run(args.source, args.every, args.frame_rate)
+    events = offline.events()
+
+    for student_id, name, first_seen, last_seen, sightings in events:
+        print(f"{format_offset(first_seen):>12}  {name} ({student_id})  "
+              f"last seen {format_offset(last_seen)}, {sightings} sightings")
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Student ID", "Name", "First Seen (s)", "Last Seen (s)", "Sightings"])
+            writer.writerows(events)
+    if start:
+        record_attendance(events, start)
+        print(f"Recorded attendance for {len(events)} students")
+
+    elapsed = max(elapsed, 1e-9)
+    print(f"{offline.frames} frames, {offline.faces} faces in {elapsed:.2f}s: "
+          f"{offline.frames / elapsed:.1f} frames/s, {offline.faces / elapsed:.1f} faces/s")
+
+
+if __name__ == "__main__":
+    main()
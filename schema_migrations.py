@@ -0,0 +1,342 @@
+import argparse
+import sys
+from datetime import date, datetime
+
+from attendance_rollups import create_rollup_tables, fill_rollups
+from student_search import candidate_query, create_trigrams_table, fill_trigrams
+
+# Each migration brings an existing database from version - 1 to version and
+# is written to be safe on databases that already have the change (tables
+# created by a newer database_setup, or upgraded by hand).
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NULL
+)
+"""
+
+
+def has_index(cursor, backend, table, index):
+    if backend == "sqlite":
+        cursor.execute(f"PRAGMA index_list({table})")
+        return any(row[1] == index for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def has_column(cursor, backend, table, column):
+    if backend == "sqlite":
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def create_index(cursor, backend, table, index, columns):
+    if not has_index(cursor, backend, table, index):
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+def attendance_unique_key(cursor, backend):
+    """One attendance row per student per day; the attendance insert skips duplicates of it"""
+    if backend == "sqlite" or has_index(cursor, backend, "attendance", "uq_attendance_student_date"):
+        # Part of the SQLite schema from the start
+        return
+    # Keep the earliest record of each student per day before adding the key
+    cursor.execute("""
+        DELETE later FROM attendance later
+        JOIN attendance earlier
+          ON later.student_id = earlier.student_id
+         AND later.date = earlier.date
+         AND later.id > earlier.id
+    """)
+    cursor.execute("""
+        ALTER TABLE attendance
+        ADD UNIQUE KEY uq_attendance_student_date (student_id, date)
+    """)
+
+
+def students_updated_at(cursor, backend):
+    """Change marker stations compare to see whether their gallery is current"""
+    if backend == "sqlite" or has_column(cursor, backend, "students", "updated_at"):
+        return
+    cursor.execute("""
+        ALTER TABLE students
+        ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+            DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+    """)
+
+
+def attendance_date_index(cursor, backend):
+    """Day lookups and newest-first listings
+
+    InnoDB and SQLite both append the primary key to secondary index
+    entries, so the index is ordered on (date, time, id).
+    """
+    create_index(cursor, backend, "attendance", "idx_attendance_date_time", "date, time")
+
+
+def students_updated_at_index(cursor, backend):
+    """Gallery reloads fetch only students changed since the last marker"""
+    create_index(cursor, backend, "students", "idx_students_updated_at", "updated_at")
+
+
+def student_search_index(cursor, backend):
+    """Trigram table behind name and department search, filled from existing students"""
+    create_trigrams_table(cursor, backend)
+    create_index(cursor, backend, "student_trigrams", "idx_student_trigrams_student", "student_id")
+    fill_trigrams(cursor)
+
+
+def attendance_rollup_tables(cursor, backend):
+    """Daily and monthly attendance counts, filled from the existing attendance rows"""
+    create_rollup_tables(cursor)
+    fill_rollups(cursor, backend)
+
+
+MIGRATIONS = [
+    (1, "attendance unique key on (student_id, date)", attendance_unique_key),
+    (2, "students.updated_at change marker", students_updated_at),
+    (3, "attendance index on (date, time)", attendance_date_index),
+    (4, "students index on updated_at", students_updated_at_index),
+    (5, "student_trigrams search index", student_search_index),
+    (6, "attendance rollup tables", attendance_rollup_tables),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    return cursor.fetchone()[0] or 0
+
+
+def apply_migrations(conn, backend, target=LATEST_VERSION):
+    """Run every migration above the recorded version; returns [(version, description)] applied"""
+    cursor = conn.cursor()
+    applied = []
+    try:
+        version = current_version(cursor)
+        for number, description, migration in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+            migration(cursor, backend)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s)",
+                (number, description, datetime.now())
+            )
+            # MySQL commits DDL implicitly; this records the version with it
+            conn.commit()
+            applied.append((number, description))
+    finally:
+        cursor.close()
+    return applied
+
+
+def partition_attendance(conn, first_year, last_year):
+    """Partition attendance by year on MySQL, or add partitions for new years
+
+    MySQL requires the partitioning column in every unique key and does not
+    support foreign keys on partitioned tables, so the first run widens the
+    primary key to (id, date) and drops the student_id foreign key. Day
+    queries then only touch one partition, and old years can be archived
+    with ALTER TABLE ... DROP PARTITION.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT partition_name FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = 'attendance'
+              AND partition_name IS NOT NULL
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        years = [y for y in range(first_year, last_year + 1) if f"p{y}" not in existing]
+        ranges = ", ".join(
+            f"PARTITION p{y} VALUES LESS THAN ('{y + 1}-01-01')" for y in years)
+        if existing:
+            if not years:
+                return []
+            cursor.execute(f"""
+                ALTER TABLE attendance REORGANIZE PARTITION pmax INTO (
+                    {ranges}, PARTITION pmax VALUES LESS THAN (MAXVALUE))
+            """)
+            return years
+
+        cursor.execute("""
+            SELECT constraint_name FROM information_schema.referential_constraints
+            WHERE constraint_schema = DATABASE() AND table_name = 'attendance'
+        """)
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE attendance DROP FOREIGN KEY `{name}`")
+        cursor.execute("ALTER TABLE attendance MODIFY date DATE NOT NULL, "
+                       "DROP PRIMARY KEY, ADD PRIMARY KEY (id, date)")
+        cursor.execute(f"""
+            ALTER TABLE attendance PARTITION BY RANGE COLUMNS(date) (
+                {ranges}, PARTITION pmax VALUES LESS THAN (MAXVALUE))
+        """)
+        return years
+    finally:
+        cursor.close()
+
+
+def hot_queries(day, student_id="0"):
+    """(name, table or alias, sql, params, ordered) for the queries run on every start and search
+
+    Each must look rows up through an index. ordered queries may instead walk
+    an index in order (they stop at LIMIT) but must not sort the result.
+    """
+    name_query, name_params = candidate_query("name", "sample")
+    return [
+        ("already marked today", "attendance",
+         "SELECT student_id FROM attendance WHERE date = %s", (day,), False),
+        ("today's attendance list", "a",
+         """SELECT a.student_id, s.name, a.date, a.time
+            FROM attendance a JOIN students s ON a.student_id = s.student_id
+            WHERE a.date = %s ORDER BY a.time DESC""", (day,), False),
+        ("student marked on day", "attendance",
+         "SELECT id FROM attendance WHERE student_id = %s AND date = %s", (student_id, day), False),
+        ("filter by date", "a",
+         """SELECT s.student_id, s.name, s.department, s.email, a.date, a.time
+            FROM students s JOIN attendance a ON s.student_id = a.student_id
+            WHERE a.date = %s ORDER BY a.date DESC, a.time DESC""", (day,), False),
+        ("viewer page", "a",
+         """SELECT s.student_id, s.name, s.department, s.email, a.date, a.time, a.id
+            FROM students s JOIN attendance a ON s.student_id = a.student_id
+            WHERE a.date <= %s AND (a.date < %s OR a.time < %s OR (a.time = %s AND a.id < %s))
+            ORDER BY a.date DESC, a.time DESC, a.id DESC LIMIT 200""",
+         (day, day, "12:00:00", "12:00:00", 1 << 30), True),
+        ("name search", "student_trigrams", name_query, tuple(name_params), False),
+        ("searched students' attendance", "a",
+         """SELECT s.student_id, s.name, s.department, s.email, a.date, a.time, a.id
+            FROM students s JOIN attendance a ON s.student_id = a.student_id
+            WHERE a.student_id IN (%s, %s)
+            ORDER BY a.date DESC, a.time DESC, a.id DESC LIMIT 200""", (student_id, "1"), False),
+        ("monthly student summary", "m",
+         """SELECT m.student_id, s.name, s.department, SUM(m.days_present)
+            FROM attendance_monthly_student m
+            LEFT JOIN students s ON s.student_id = m.student_id
+            WHERE m.month BETWEEN %s AND %s
+            GROUP BY m.student_id, s.name, s.department""", (day.replace(day=1), day), False),
+        ("gallery changes", "students",
+         """SELECT student_id, name, face_encoding FROM students
+            WHERE face_encoding IS NOT NULL AND updated_at >= %s""", (datetime.now(),), False),
+    ]
+
+
+def explain(cursor, backend, sql, params):
+    """Query plan as a list of (table, access, sorts, detail)
+
+    access is "seek" for index lookups, "index" for a walk over a whole
+    index and "scan" for a full table scan.
+    """
+    if backend == "sqlite":
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        steps = []
+        for row in cursor.fetchall():
+            detail = row[-1]
+            words = detail.replace(" TABLE ", " ").split()
+            if words[0] in ("SCAN", "SEARCH"):
+                table = words[words.index("AS") + 1] if "AS" in words else words[1]
+                # ANY(column) is a skip-scan over the whole index
+                if words[0] == "SEARCH" and "ANY(" not in detail:
+                    access = "seek"
+                else:
+                    access = "index" if "INDEX" in words else "scan"
+                steps.append((table, access, False, detail))
+            elif "TEMP B-TREE" in detail:
+                steps.append((None, None, True, detail))
+        return steps
+
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [c[0].lower() for c in cursor.description]
+    steps = []
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        extra = plan.get("extra") or ""
+        detail = f"type={plan['type']} key={plan['key']} rows={plan['rows']} {extra}".strip()
+        if plan["type"] == "ALL" or plan["key"] is None:
+            access = "scan"
+        else:
+            access = "index" if plan["type"] == "index" else "seek"
+        steps.append((plan["table"], access, "filesort" in extra, detail))
+    return steps
+
+
+def check_plans(conn, backend, day=None):
+    """EXPLAIN every hot query; returns [(name, ok, plan details)]"""
+    cursor = conn.cursor()
+    results = []
+    try:
+        for name, table, sql, params, ordered in hot_queries(day or date.today()):
+            steps = explain(cursor, backend, sql, params)
+            allowed = ("seek", "index") if ordered else ("seek",)
+            ok = all(access in allowed for t, access, _, _ in steps if t == table)
+            if ordered:
+                ok = ok and not any(sorts for _, _, sorts, _ in steps)
+            results.append((name, ok, [detail for _, _, _, detail in steps]))
+    finally:
+        cursor.close()
+    return results
+
+
+def main():
+    from data_access import connect, get_database
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations and check query plans")
+    parser.add_argument("--status", action="store_true", help="Show the schema version and exit")
+    parser.add_argument("--target", type=int, default=LATEST_VERSION, help="Migrate up to this version")
+    parser.add_argument("--check", action="store_true",
+                        help="EXPLAIN the hot queries and fail if one scans a whole table")
+    parser.add_argument("--partition", nargs=2, type=int, metavar=("FIRST_YEAR", "LAST_YEAR"),
+                        help="Partition attendance by year (MySQL only)")
+    args = parser.parse_args()
+
+    backend = get_database().backend
+    conn = connect()
+    try:
+        if args.status:
+            cursor = conn.cursor()
+            try:
+                version = current_version(cursor)
+            finally:
+                cursor.close()
+            print(f"Schema version {version} of {LATEST_VERSION}")
+            for number, description, _ in MIGRATIONS:
+                print(f"  {'applied' if number <= version else 'pending'}  {number}: {description}")
+            return
+
+        for number, description in apply_migrations(conn, backend, args.target):
+            print(f"Applied migration {number}: {description}")
+
+        if args.partition:
+            if backend != "mysql":
+                print("Partitioning is only supported on MySQL")
+                sys.exit(1)
+            added = partition_attendance(conn, *args.partition)
+            print(f"Added partitions for {', '.join(map(str, added))}" if added
+                  else "attendance already has those partitions")
+
+        if args.check:
+            failed = 0
+            for name, ok, details in check_plans(conn, backend):
+                failed += not ok
+                print(f"{'ok  ' if ok else 'FAIL'}  {name}")
+                for detail in details:
+                    print(f"        {detail}")
+            if failed:
+                print(f"{failed} queries do not use an index")
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
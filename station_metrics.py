@@ -0,0 +1,303 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency buckets, in milliseconds
+LATENCY_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Every exported metric name starts with this
+PREFIX = "faceattend"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every frame"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"buckets": list(self.buckets), "counts": list(self.counts),
+                "sum": self.sum, "count": self.count}
+
+
+def histogram_percentile(snapshot, q):
+    """Upper bound of the bucket holding the q-th percentile (inf past the last bucket)"""
+    if not snapshot["count"]:
+        return 0.0
+    target = snapshot["count"] * q / 100.0
+    seen = 0
+    for bound, count in zip(snapshot["buckets"] + [float("inf")], snapshot["counts"]):
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+class StationMetrics:
+    """Counters, per-stage latency histograms and rolling rates for one station
+
+    Everything is updated from the recognition, pipeline and writer threads
+    and read by the stats panel and the exporter, so all state sits behind one
+    lock. snapshot() returns plain data that can be sent between processes.
+    """
+
+    def __init__(self, labels=None, window=60.0, fps_window=10.0):
+        self.labels = dict(labels or {})
+        self.window = window
+        self.fps_window = fps_window
+        self.lock = threading.Lock()
+
+        self.histograms = {}
+        self.counters = {}
+        # name -> (read function, is_counter) for values owned by other objects
+        self.watched = {}
+        # (time, counter name, amount) within the rate window
+        self.recent = deque()
+        self.frame_times = deque()
+
+    def observe(self, stage, ms):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(ms)
+
+    @contextmanager
+    def timed(self, stage):
+        """Record how long the with-block took as a sample of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000.0)
+
+    def count(self, name, amount=1):
+        if not amount:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            self.recent.append((now, name, amount))
+            self._expire(now)
+
+    def frame(self):
+        """Mark one frame handled, for the rolling FPS"""
+        now = time.monotonic()
+        with self.lock:
+            self.frame_times.append(now)
+            self.counters["frames"] = self.counters.get("frames", 0) + 1
+            self._expire(now)
+
+    def faces(self, detections):
+        """Count the detected, recognized and unknown faces in one frame's detections"""
+        recognized = sum(1 for d in detections if d.match.is_match)
+        self.count("faces_detected", len(detections))
+        self.count("faces_recognized", recognized)
+        self.count("faces_unknown", len(detections) - recognized)
+
+    def watch(self, name, read, counter=False):
+        """Export read() as a gauge (queue depths) or as a counter kept elsewhere"""
+        with self.lock:
+            self.watched[name] = (read, counter)
+
+    def _expire(self, now):
+        while self.recent and self.recent[0][0] < now - self.window:
+            self.recent.popleft()
+        while self.frame_times and self.frame_times[0] < now - self.fps_window:
+            self.frame_times.popleft()
+
+    def snapshot(self):
+        """Plain-data copy of every metric"""
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            per_minute = {}
+            for _, name, amount in self.recent:
+                per_minute[name] = per_minute.get(name, 0) + amount
+            scale = 60.0 / self.window
+            if len(self.frame_times) > 1:
+                span = max(now - self.frame_times[0], 1e-9)
+                fps = (len(self.frame_times) - 1) / span
+            else:
+                fps = 0.0
+            counters = dict(self.counters)
+            gauges = {"fps": fps}
+            watched = list(self.watched.items())
+            histograms = {stage: h.snapshot() for stage, h in self.histograms.items()}
+
+        for name, (read, counter) in watched:
+            try:
+                value = read()
+            except Exception:
+                continue
+            (counters if counter else gauges)[name] = value
+        return {
+            "labels": dict(self.labels),
+            "counters": counters,
+            "gauges": gauges,
+            "per_minute": {name: amount * scale for name, amount in per_minute.items()},
+            "histograms": histograms,
+        }
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def format_prometheus(snapshots):
+    """Render snapshots from one or more stations in the Prometheus text format"""
+    families = {}
+
+    def add(name, kind, help_text, line):
+        family = families.setdefault(name, (kind, help_text, []))
+        family[2].append(line)
+
+    for snap in snapshots:
+        labels = snap["labels"]
+        for name, value in sorted(snap["counters"].items()):
+            metric = f"{PREFIX}_{name}_total"
+            add(metric, "counter", f"Total {name.replace('_', ' ')}",
+                f"{metric}{format_labels(labels)} {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            metric = f"{PREFIX}_{name}"
+            add(metric, "gauge", f"Current {name.replace('_', ' ')}",
+                f"{metric}{format_labels(labels)} {value}")
+        for name, value in sorted(snap["per_minute"].items()):
+            metric = f"{PREFIX}_{name}_per_minute"
+            add(metric, "gauge", f"{name.replace('_', ' ').capitalize()} over the last minute",
+                f"{metric}{format_labels(labels)} {value:.3f}")
+
+        metric = f"{PREFIX}_stage_latency_seconds"
+        for stage, h in sorted(snap["histograms"].items()):
+            cumulative = 0
+            for bound, count in zip(h["buckets"] + ["+Inf"], h["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound / 1000.0:g}"
+                add(metric, "histogram", "Latency of each pipeline stage",
+                    f"{metric}_bucket{format_labels(labels, stage=stage, le=le)} {cumulative}")
+            add(metric, "histogram", "Latency of each pipeline stage",
+                f"{metric}_sum{format_labels(labels, stage=stage)} {h['sum'] / 1000.0:.6f}")
+            add(metric, "histogram", "Latency of each pipeline stage",
+                f"{metric}_count{format_labels(labels, stage=stage)} {h['count']}")
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def summary_lines(snap):
+    """Short human-readable summary for the stats panel"""
+    per_minute = snap["per_minute"]
+    gauges = snap["gauges"]
+    lines = [
+        f"FPS {gauges.get('fps', 0.0):.1f}   faces/min {per_minute.get('faces_detected', 0):.0f} "
+        f"({per_minute.get('faces_recognized', 0):.0f} recognized, "
+        f"{per_minute.get('faces_unknown', 0):.0f} unknown)"
+    ]
+    stages = []
+    for stage, h in sorted(snap["histograms"].items()):
+        if h["count"]:
+            stages.append(f"{stage} avg {h['sum'] / h['count']:.0f} ms, "
+                          f"p95 <{histogram_percentile(h, 95):g} ms")
+    lines.extend(stages)
+    queues = [f"{name} {value}" for name, value in sorted(gauges.items()) if name.endswith("_queue")]
+    if queues:
+        lines.append("Queues: " + ", ".join(queues))
+    return lines
+
+
+class MetricsExporter:
+    """Expose Prometheus metrics over HTTP at /metrics and/or in a file
+
+    collect returns the snapshots to export. The file is rewritten every
+    interval seconds with an atomic replace, so it can be picked up by a
+    node exporter textfile collector.
+    """
+
+    def __init__(self, collect, port=None, path=None, interval=5.0, host="127.0.0.1"):
+        self.collect = collect
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.host = host
+        self.server = None
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def render(self):
+        return format_prometheus(self.collect())
+
+    def start(self):
+        self.stop_event.clear()
+        if self.port:
+            exporter = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = exporter.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            self.threads.append(threading.Thread(target=self.server.serve_forever,
+                                                 name="metrics-http", daemon=True))
+        if self.path:
+            self.threads.append(threading.Thread(target=self._write_loop,
+                                                 name="metrics-file", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        for thread in self.threads:
+            thread.join(timeout=self.interval + 1)
+        self.threads = []
+        if self.path:
+            self.write_file()
+
+    def write_file(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    def _write_loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.write_file()
+            except OSError:
+                # Keep exporting; the directory may come back
+                pass
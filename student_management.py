@@ -1,15 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import mysql.connector
+from data_access import Error, IntegrityError, connect
 import cv2
-import face_recognition
 import numpy as np
 import os
 from datetime import datetime
 from PIL import Image, ImageTk  # For image display
+from face_store import FaceImageStore
+from face_detectors import make_detector
+from face_capture import FaceCaptureWorker
+from embedding_format import encode_embedding
+from video_preview import PreviewRenderer
+from student_search import index_student
 
 class StudentManagementApp:
-    def __init__(self, root):
+    def __init__(self, root, detector="hog"):
         """
         Initialize the main application window and database connection
         """
@@ -20,9 +25,13 @@ class StudentManagementApp:
         # Database connection setup
         self.db_connection()
         
-        # Create directory for storing face images
+        # Sharded store for face images
         self.dataset_path = os.path.join(os.path.dirname(__file__), "face_dataset")
-        os.makedirs(self.dataset_path, exist_ok=True)
+        self.face_store = FaceImageStore(self.dataset_path)
+        
+        # Face detector backend used while capturing samples
+        self.detector = make_detector(detector)
+        self.capture_worker = None
         
         # Setup the user interface
         self.setup_ui()
@@ -32,28 +41,25 @@ class StudentManagementApp:
     
     def db_connection(self):
         """
-        Establish connection to MySQL database with error handling
+        Establish connection to the database with error handling
         """
         try:
-            self.db = mysql.connector.connect(
-                host="localhost",
-                user="root",      # Change to your MySQL username
-                password="harsh@2002",      # Change to your MySQL password
-                database="attendance_system"
-            )
+            # Credentials come from db_config.json or ATTENDANCE_DB_* variables
+            self.db = connect()
             self.cursor = self.db.cursor()
-        except mysql.connector.Error as err:
-            # Handle specific database errors
-            if err.errno == 1049:  # Database doesn't exist
+        except Error as err:
+            # Handle specific database errors (MySQL error numbers)
+            errno = getattr(err, "errno", None)
+            if errno == 1049:  # Database doesn't exist
                 messagebox.showerror("Database Error", 
                     "The 'attendance_system' database doesn't exist.\n"
                     "Please run the database setup script first.")
-            elif err.errno == 1045:  # Access denied
+            elif errno == 1045:  # Access denied
                 messagebox.showerror("Access Denied",
                     "Incorrect username/password.\n"
                     "Default credentials: user='root', password=''")
             else:
-                messagebox.showerror("Database Error", f"Error {err.errno}: {err.msg}")
+                messagebox.showerror("Database Error", f"Error {errno}: {err}")
             self.root.destroy()
     
     def setup_ui(self):
@@ -141,7 +147,7 @@ class StudentManagementApp:
             for row in self.cursor.fetchall():
                 self.tree.insert("", "end", values=row)
                 
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", f"Failed to load students:\n{err}")
     
     def load_selected_student(self, event):
@@ -181,15 +187,16 @@ class StudentManagementApp:
                 "INSERT INTO students (student_id, name, department, email) VALUES (%s, %s, %s, %s)",
                 (student_id, name, department, email)
             )
+            index_student(self.cursor, student_id, name, department)
             self.db.commit()
             
             messagebox.showinfo("Success", "Student added successfully!")
             self.load_students()
             self.clear_form()
             
-        except mysql.connector.IntegrityError:
+        except IntegrityError:
             messagebox.showerror("Error", "Student ID already exists!")
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", f"Failed to add student:\n{err}")
     
     def update_student(self):
@@ -218,14 +225,16 @@ class StudentManagementApp:
                 WHERE id=%s""",
                 (student_id, name, department, email, self.tree.item(selected, "values")[0])
             )
+            # Search trigrams follow a changed student_id by cascade; refresh the text
+            index_student(self.cursor, student_id, name, department)
             self.db.commit()
             
             messagebox.showinfo("Success", "Student updated successfully!")
             self.load_students()
             
-        except mysql.connector.IntegrityError:
+        except IntegrityError:
             messagebox.showerror("Error", "Student ID already exists!")
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", f"Failed to update student:\n{err}")
     
     def delete_student(self):
@@ -255,28 +264,27 @@ class StudentManagementApp:
             self.load_students()
             self.clear_form()
             
-        except mysql.connector.Error as err:
+        except Error as err:
             messagebox.showerror("Database Error", f"Failed to delete student:\n{err}")
     
     def delete_face_images(self, student_id):
         """Delete all face images for a student"""
         try:
-            for filename in os.listdir(self.dataset_path):
-                if filename.startswith(f"{student_id}_"):
-                    os.remove(os.path.join(self.dataset_path, filename))
+            self.face_store.delete_student(student_id)
         except Exception as e:
             print(f"Error deleting face images: {e}")
     
     def capture_face(self):
-        """Capture and store face images and encoding for selected student"""
+        """Capture face samples for the selected student without blocking the window"""
         selected = self.tree.focus()
         if not selected:
             messagebox.showerror("Error", "Please select a student first!")
             return
+        if self.capture_worker:
+            messagebox.showinfo("Capture", "A face capture is already running")
+            return
             
         student_id = self.tree.item(selected, "values")[1]
-        sample_count = 0
-        face_encodings = []
         
         # Initialize video capture
         cap = cv2.VideoCapture(0)
@@ -284,63 +292,61 @@ class StudentManagementApp:
             messagebox.showerror("Error", "Could not open video device")
             return
         
-        # Create window for video feed
-        cv2.namedWindow("Face Capture", cv2.WINDOW_NORMAL)
+        # Preview window; samples are detected and checked on a background thread
+        window = tk.Toplevel(self.root)
+        window.title(f"Face Capture - {student_id}")
+        window.geometry("660x560")
+        video_label = tk.Label(window, bg="black")
+        video_label.pack(fill="both", expand=True)
+        status_var = tk.StringVar(value="Look at the camera...")
+        tk.Label(window, textvariable=status_var).pack(pady=5)
         
-        try:
-            while sample_count < 5:  # Capture 5 samples
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Convert to RGB for face recognition
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Detect faces
-                face_locations = face_recognition.face_locations(rgb_frame)
-                
-                if face_locations:
-                    # Get face encodings
-                    face_encoding = face_recognition.face_encodings(rgb_frame, face_locations)[0]
-                    face_encodings.append(face_encoding)
-                    
-                    # Save face image
-                    sample_count += 1
-                    img_path = os.path.join(self.dataset_path, f"{student_id}_{sample_count}.jpg")
-                    cv2.imwrite(img_path, frame)
-                    
-                    # Draw rectangle around face
-                    top, right, bottom, left = face_locations[0]
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame, f"Sample {sample_count}/5", (left, top-10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                
-                # Display the frame
-                cv2.imshow("Face Capture", frame)
-                
-                # Break on ESC key or when we have enough samples
-                if cv2.waitKey(1) == 27 or sample_count >= 5:
-                    break
-            
-            if face_encodings:
-                # Calculate average encoding for better accuracy
-                avg_encoding = np.mean(face_encodings, axis=0)
-                
-                # Store in database
-                try:
-                    self.cursor.execute(
-                        "UPDATE students SET face_encoding=%s WHERE student_id=%s",
-                        (avg_encoding.tobytes(), student_id)
-                    )
-                    self.db.commit()
-                    messagebox.showinfo("Success", f"Captured {sample_count} face samples!")
-                except mysql.connector.Error as err:
-                    messagebox.showerror("Database Error", f"Failed to save face encoding:\n{err}")
+        worker = FaceCaptureWorker(cap, self.detector)
+        tk.Button(window, text="Cancel", width=10, command=worker.cancel).pack(pady=5)
+        window.protocol("WM_DELETE_WINDOW", worker.cancel)
         
-        finally:
-            # Release resources
-            cap.release()
-            cv2.destroyAllWindows()
+        self.capture_worker = worker
+        worker.start()
+        self.poll_capture(student_id, worker, window, PreviewRenderer(video_label), status_var, 0)
+    
+    def poll_capture(self, student_id, worker, window, preview, status_var, painted_seq):
+        """Paint the capture preview and finish enrolment once the worker is done"""
+        latest = worker.latest()
+        if latest and latest[0] != painted_seq:
+            painted_seq, frame = latest
+            preview.render(frame)
+        status_var.set(worker.status())
+        
+        if not worker.done.is_set():
+            window.after(preview.interval, self.poll_capture, student_id, worker, window,
+                         preview, status_var, painted_seq)
+            return
+        
+        self.capture_worker = None
+        window.destroy()
+        if worker.error:
+            messagebox.showerror("Error", worker.error)
+        if len(worker.accepted) < worker.samples:
+            # Cancelled or failed: keep the student's existing samples and encoding
+            return
+        
+        for number, (frame, _) in enumerate(worker.accepted, start=1):
+            self.face_store.save_image(student_id, number, frame)
+        
+        # Calculate average encoding for better accuracy
+        avg_encoding = np.mean([encoding for _, encoding in worker.accepted], axis=0)
+        
+        # Store in database
+        try:
+            self.cursor.execute(
+                "UPDATE students SET face_encoding=%s WHERE student_id=%s",
+                (encode_embedding(avg_encoding), student_id)
+            )
+            self.db.commit()
+            messagebox.showinfo("Success", f"Captured {len(worker.accepted)} face samples "
+                                f"from {worker.frames} frames ({worker.encoder_calls} encoded)!")
+        except Error as err:
+            messagebox.showerror("Database Error", f"Failed to save face encoding:\n{err}")
     
     def clear_form(self):
         """Clear all input fields"""
@@ -0,0 +1,218 @@
+import argparse
+import threading
+import time
+import unicodedata
+
+# Substring search on students.name and students.department is served by
+# student_trigrams: every 3-character slice of the normalised text, keyed
+# (field, trigram, student_id). The students that have all of a term's
+# trigrams are candidates; only their text is read and checked for the term.
+SEARCH_FIELDS = ("name", "department")
+
+TRIGRAMS_TABLE = """
+CREATE TABLE IF NOT EXISTS student_trigrams (
+    field VARCHAR(10) NOT NULL,
+    trigram VARCHAR(3){collate} NOT NULL,
+    student_id VARCHAR(20) NOT NULL,
+    PRIMARY KEY (field, trigram, student_id),
+    FOREIGN KEY (student_id) REFERENCES students(student_id)
+        ON DELETE CASCADE ON UPDATE CASCADE
+)
+"""
+
+
+def normalize(text):
+    """Case- and accent-folded text, close to what the default MySQL collation compares equal"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def trigrams(text):
+    text = normalize(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def create_trigrams_table(cursor, backend):
+    # Trigrams are already folded; compare them byte for byte on MySQL
+    collate = "" if backend == "sqlite" else " CHARACTER SET utf8mb4 COLLATE utf8mb4_bin"
+    cursor.execute(TRIGRAMS_TABLE.format(collate=collate))
+
+
+def index_student(cursor, student_id, name, department):
+    """Replace a student's trigrams; run in the same transaction as the students write"""
+    cursor.execute("DELETE FROM student_trigrams WHERE student_id = %s", (student_id,))
+    rows = [(field, gram, student_id)
+            for field, text in zip(SEARCH_FIELDS, (name, department))
+            for gram in sorted(trigrams(text))]
+    if rows:
+        cursor.executemany(
+            "INSERT IGNORE INTO student_trigrams (field, trigram, student_id) VALUES (%s, %s, %s)",
+            rows
+        )
+
+
+def fill_trigrams(cursor):
+    """Rebuild every student's trigrams without committing; returns the number of students"""
+    cursor.execute("DELETE FROM student_trigrams")
+    cursor.execute("SELECT student_id, name, department FROM students")
+    students = cursor.fetchall()
+    for student_id, name, department in students:
+        index_student(cursor, student_id, name, department)
+    return len(students)
+
+
+def candidate_query(field, term):
+    """(sql, params) selecting (student_id, field text) for students that may contain term"""
+    if field not in SEARCH_FIELDS:
+        raise ValueError(f"Unknown search field: {field}")
+    grams = sorted(trigrams(term))
+    if not grams:
+        # Under three characters there is nothing to look up; students is
+        # small, it is the attendance join that must not be scanned
+        return f"SELECT student_id, {field} FROM students", []
+    placeholders = ", ".join(["%s"] * len(grams))
+    query = f"""
+        SELECT s.student_id, s.{field} FROM students s
+        JOIN (SELECT student_id FROM student_trigrams
+              WHERE field = %s AND trigram IN ({placeholders})
+              GROUP BY student_id HAVING COUNT(*) = %s) t
+          ON t.student_id = s.student_id
+    """
+    return query, [field, *grams, len(grams)]
+
+
+def matching_query(name, department, backend):
+    """(sql, params) selecting the student_ids matching_ids finds, for use as a subquery
+
+    For filters that match too many students to pass as parameters. The
+    same trigram candidates are checked in SQL: by the case- and
+    accent-insensitive collation on MySQL, and by the fold() function the
+    SQLite connections register on SQLite.
+    """
+    query, params = None, []
+    for field, term in zip(SEARCH_FIELDS, (name, department)):
+        if not term:
+            continue
+        sql, sql_params = candidate_query(field, term)
+        text = f"fold(c.{field})" if backend == "sqlite" else f"c.{field}"
+        part = f"SELECT c.student_id FROM ({sql}) c WHERE INSTR({text}, %s) > 0"
+        part_params = sql_params + [normalize(term)]
+        if query:
+            part += f" AND c.student_id IN ({query})"
+            part_params += params
+        query, params = part, part_params
+    return query, params
+
+
+class TTLCache:
+    """Thread-safe cache whose entries expire ttl seconds after they are stored"""
+
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}  # key -> (expires at, value)
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        """Cached value, or None when missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                # Drop expired entries, then the oldest ones
+                self.entries = {k: e for k, e in self.entries.items() if e[0] > now}
+                while len(self.entries) >= self.max_entries:
+                    del self.entries[next(iter(self.entries))]
+            self.entries[key] = (now + self.ttl, value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class StudentSearch:
+    """Name and department lookups with a short-lived cache for repeated terms
+
+    Typing, paging and counting the same filter all ask for the same
+    students; within ttl seconds only the first one reaches the database.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.cache = TTLCache(ttl)
+
+    def matching_ids(self, name=None, department=None):
+        """Sorted student_ids whose name and department contain the terms, or None without terms"""
+        terms = [(field, term) for field, term in zip(SEARCH_FIELDS, (name, department)) if term]
+        if not terms:
+            return None
+        key = tuple((field, normalize(term)) for field, term in terms)
+        ids = self.cache.get(key)
+        if ids is not None:
+            return ids
+
+        from data_access import connect
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                found = None
+                for field, term in terms:
+                    # Checked here rather than with LIKE, which does not fold
+                    # accents on SQLite
+                    needle = normalize(term)
+                    cursor.execute(*candidate_query(field, term))
+                    matches = {student_id for student_id, text in cursor.fetchall()
+                               if needle in normalize(text)}
+                    found = matches if found is None else found & matches
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        ids = sorted(found)
+        self.cache.put(key, ids)
+        return ids
+
+
+def main():
+    from data_access import connect
+
+    parser = argparse.ArgumentParser(description="Student name and department search index")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild student_trigrams from the students table")
+    parser.add_argument("--name", help="Look up students whose name contains this")
+    parser.add_argument("--department", help="Look up students whose department contains this")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                count = fill_trigrams(cursor)
+            finally:
+                cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Indexed {count} students")
+
+    if args.name or args.department:
+        started = time.perf_counter()
+        ids = StudentSearch().matching_ids(args.name, args.department)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{len(ids)} students in {elapsed:.1f} ms: {', '.join(ids[:20])}"
+              f"{' ...' if len(ids) > 20 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from datetime import date, time
+
+import pytest
+
+import attendance_report
+import data_access
+from attendance_report import MAX_ID_LIST, AttendancePager, report_filter
+from student_search import index_student
+
+STUDENTS = MAX_ID_LIST + 100
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    config = dict(data_access.load_config(None), backend="sqlite", path=str(tmp_path / "a.sqlite3"))
+    monkeypatch.setattr(data_access, "_database", data_access.Database(config))
+    attendance_report.student_search.cache.clear()
+    conn = data_access.connect()
+    cursor = conn.cursor()
+    for i in range(STUDENTS):
+        # Every student matches "génie"; odd ones only without the accent
+        department = "Génie Civil" if i % 2 else "Genie Civil"
+        cursor.execute("INSERT INTO students (student_id, name, department, email) VALUES (%s, %s, %s, %s)",
+                       (f"S{i:05d}", f"Student {i}", department, f"s{i}@example.com"))
+        index_student(cursor, f"S{i:05d}", f"Student {i}", department)
+    cursor.execute("INSERT INTO students (student_id, name, department, email) VALUES (%s, %s, %s, %s)",
+                   ("X00001", "Other", "MCA", "other@example.com"))
+    index_student(cursor, "X00001", "Other", "MCA")
+    rows = [(f"S{i:05d}", date(2024, 3, 1 + i % 2), time(9, i % 60)) for i in range(STUDENTS)]
+    rows.append(("X00001", date(2024, 3, 1), time(9)))
+    cursor.executemany("INSERT INTO attendance (student_id, date, time) VALUES (%s, %s, %s)", rows)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    yield
+    data_access._database.close_all()
+
+
+def test_filter_matching_more_than_max_id_list(database):
+    where, params = report_filter(department="GÉNIE")
+    assert len(params) < MAX_ID_LIST
+    assert "LIKE" not in where and "student_trigrams" in where
+
+    pager = AttendancePager(department="GÉNIE", page_size=250)
+    rows = []
+    while True:
+        page = pager.next_page()
+        if not page:
+            break
+        rows += page
+    assert pager.count() == STUDENTS
+    assert sorted(row[0] for row in rows) == [f"S{i:05d}" for i in range(STUDENTS)]
+
+
+def test_large_filter_combines_terms_and_date(database):
+    pager = AttendancePager(name="STUDENT", department="genie", specific_date="2024-03-02",
+                            page_size=STUDENTS)
+    expected = {f"S{i:05d}" for i in range(STUDENTS) if i % 2}
+    assert len(expected) > MAX_ID_LIST // 2
+    assert {row[0] for row in pager.next_page()} == expected
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+import data_access
+from attendance_writer import AttendanceWriter
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    config = dict(data_access.load_config(None), backend="sqlite", path=str(tmp_path / "a.sqlite3"))
+    monkeypatch.setattr(data_access, "_database", data_access.Database(config))
+    conn = data_access.connect()
+    cursor = conn.cursor()
+    for student_id in ("S1", "S2"):
+        cursor.execute("INSERT INTO students (student_id, name, department, email) VALUES (%s, %s, %s, %s)",
+                       (student_id, student_id, "MCA", f"{student_id}@example.com"))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    yield
+    data_access._database.close_all()
+
+
+def attendance_rows():
+    conn = data_access.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT student_id FROM attendance ORDER BY student_id")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_rejected_row_does_not_lose_the_batch(database):
+    writer = AttendanceWriter(data_access.connect, flush_interval=0.05)
+    writer.start()
+    now = datetime(2024, 3, 1, 9, 0)
+    for student_id in ("S1", "GONE", "S2", "S1"):
+        writer.submit(student_id, student_id, now)
+    assert writer.flush(timeout=5.0)
+    writer.stop()
+
+    assert attendance_rows() == ["S1", "S2"]
+    failed = drain(writer.failed)
+    assert [[event[0] for event in events] for events, _ in failed] == [["GONE"]]
+    assert sorted(event[0] for event in drain(writer.written)) == ["S1", "S1", "S2"]
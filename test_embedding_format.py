@@ -0,0 +1,46 @@
+import numpy as np
+
+from embedding_format import (accuracy_check, decode_embedding, encode_embedding,
+                              nearest_float64)
+
+
+def test_reference_distances_stay_float64():
+    # 0.1 + 1e-9 is below float32 resolution at 0.1, so a float32 reference
+    # would report exactly the float32 value of 0.1
+    gallery = np.zeros((2, 128))
+    gallery[1, 0] = 5.0
+    probe = np.zeros((1, 128))
+    probe[0, 0] = 0.1 + 1e-9
+
+    rows, distances = nearest_float64(gallery, probe)
+
+    assert distances.dtype == np.float64
+    assert rows[0] == 0
+    assert abs(distances[0] - (0.1 + 1e-9)) < 1e-15
+    assert distances[0] != np.float32(distances[0])
+
+
+def test_reference_decides_near_tolerance_in_float64():
+    # Distance just above the tolerance in float64 but equal to it in float32
+    gallery = np.zeros((1, 128))
+    probe = np.zeros((1, 128))
+    probe[0, 0] = 0.6 + 1e-9
+
+    _, distances = nearest_float64(gallery, probe)
+
+    assert distances[0] > 0.6
+    assert np.float32(distances[0]) <= np.float32(0.6)
+
+
+def test_roundtrip_float32():
+    vector = np.random.default_rng(1).normal(0, 0.1, 128)
+    decoded = decode_embedding(encode_embedding(vector, "float32"))
+    assert np.allclose(decoded, vector, atol=1e-6)
+
+
+def test_accuracy_check_reports_every_dtype():
+    gallery = np.random.default_rng(2).normal(0, 0.1, (50, 128))
+    report = accuracy_check(gallery, queries=100)
+    assert set(report) == {"float32", "float16", "int8"}
+    for result in report.values():
+        assert 0.0 <= result["agreement"] <= 1.0
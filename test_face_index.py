@@ -0,0 +1,29 @@
+import copy
+
+import numpy as np
+
+from face_index import IVFIndex, synthetic_gallery
+
+
+def test_ivf_searches_the_callers_matrix_without_copying():
+    matrix = synthetic_gallery(2000)
+    index = IVFIndex(nprobe=4).build(matrix)
+    assert index.matrix is matrix
+    assert not any(isinstance(v, np.ndarray) and v.size >= matrix.size and v is not matrix
+                   for v in vars(index).values())
+
+    rows, distances = index.search(matrix[:50], 1)
+    assert (rows[:, 0] == np.arange(50)).all()
+    assert np.allclose(distances[:, 0], 0.0, atol=1e-3)
+
+
+def test_ivf_layout_is_reused_once():
+    matrix = synthetic_gallery(2000)
+    trained = IVFIndex(nprobe=4).build(matrix)
+    queries = matrix[::40] + 0.01
+
+    template = IVFIndex(nprobe=4, seed=1, layout=trained.get_layout())
+    reused = copy.copy(template).build(matrix)
+    assert reused.row_ids is trained.row_ids
+    assert all((a == b).all() for a, b in zip(reused.search(queries, 2), trained.search(queries, 2)))
+    assert reused.layout is None
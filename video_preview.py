@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from face_recognizer import draw_detections
+
+
+class PreviewRenderer:
+    """Paint BGR frames into a Tk label at the label's size, reusing every buffer
+
+    Each frame is resized straight into a preallocated buffer that matches the
+    label, converted to RGB in place and overlaid there, then pasted into one
+    long-lived PhotoImage. New buffers are only allocated when the label
+    changes size. max_fps caps how often the Tk loop should call render.
+    """
+
+    def __init__(self, label, max_fps=30):
+        self.label = label
+        self.max_fps = max_fps
+        self.buffer = None
+        self.photo = None
+
+    @property
+    def interval(self):
+        """Milliseconds between paints"""
+        return max(1, int(1000 / self.max_fps))
+
+    def target_size(self, frame_shape):
+        """Largest (width, height) with the frame's aspect ratio that fits in the label"""
+        frame_height, frame_width = frame_shape[:2]
+        border = 2 * (int(self.label.cget("borderwidth")) + int(self.label.cget("highlightthickness")))
+        width = self.label.winfo_width() - border
+        height = self.label.winfo_height() - border
+        if width < 16 or height < 16:
+            # Not laid out yet
+            return frame_width, frame_height
+        scale = min(width / frame_width, height / frame_height)
+        return max(1, int(frame_width * scale)), max(1, int(frame_height * scale))
+
+    def render(self, frame, detections=()):
+        """Show a BGR frame with boxes for detections given in frame pixels"""
+        width, height = self.target_size(frame.shape)
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+            self.photo = ImageTk.PhotoImage("RGB", (width, height))
+            self.label.config(image=self.photo)
+
+        shrinking = width < frame.shape[1]
+        cv2.resize(frame, (width, height), dst=self.buffer,
+                   interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        cv2.cvtColor(self.buffer, cv2.COLOR_BGR2RGB, dst=self.buffer)
+        if detections:
+            draw_detections(self.buffer, detections, scale=width / frame.shape[1])
+        self.photo.paste(Image.fromarray(self.buffer))
+
+    def clear(self):
+        self.label.config(image="")
+        self.buffer = None
+        self.photo = None